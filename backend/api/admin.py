@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import CustomUser
-from .models import Submission, UserProfile, University, Course, UserSavedCourse, Feedback, FeedbackResponse
+from .models import Submission, UserProfile, University, Course, UserSavedCourse, Feedback, FeedbackResponse, Announcement
 
 # Register your models here.
 class UserProfileInline(admin.StackedInline):
@@ -60,3 +60,10 @@ class FeedbackResponseAdmin(admin.ModelAdmin):
     list_display = ('feedback', 'admin', 'created_at')
     list_filter = ('created_at',)
     search_fields = ('message', 'feedback__subject', 'admin__username')
+
+# Register Announcement
+@admin.register(Announcement)
+class AnnouncementAdmin(admin.ModelAdmin):
+    list_display = ('message', 'audience', 'sender', 'created_at')
+    list_filter = ('audience', 'created_at')
+    search_fields = ('message',)
@@ -1,87 +1,143 @@
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication as BaseJWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
 from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
+from . import user_cache
+from .models import TokenClaimsUser
+
+
 import logging
 
 logger = logging.getLogger('django.auth')
 
-class CookieJWTAuthentication(JWTAuthentication):
-    def authenticate(self, request):
-        """
-        Attempt JWT auth via httpOnly cookie, but NEVER block other auth backends
-        (e.g., SessionAuthentication) if the JWT is missing/invalid. This is
-        critical for social logins (Google) which rely on the Django session.
-        """
-        # Try to get JWT from cookie first
-        access_token = request.COOKIES.get(getattr(settings, 'JWT_AUTH_COOKIE', 'access_token'))
-        if access_token:
-            try:
-                validated_token = self.get_validated_token(access_token)
-                return self.get_user(validated_token), validated_token
-            except Exception as e:
-                # Do not raise; fall through so SessionAuthentication can succeed
-                logger.warning(f"[CookieJWTAuthentication] Invalid JWT cookie, falling back to other auth backends: {e}")
-                # continue to header attempt below
-
-        # Next, try Authorization header, but never raise on failure
-        try:
-            header = self.get_header(request)
-            if header is None:
-                return None
-            raw_token = self.get_raw_token(header)
-            if raw_token is None:
-                return None
-            try:
-                validated_token = self.get_validated_token(raw_token)
-                return self.get_user(validated_token), validated_token
-            except Exception as e:
-                logger.warning(f"[CookieJWTAuthentication] Invalid JWT in Authorization header, ignoring: {e}")
-                return None
-        except Exception as e:
-            logger.warning(f"[CookieJWTAuthentication] Header processing error, ignoring: {e}")
-            return None
-from rest_framework_simplejwt.authentication import JWTAuthentication as BaseJWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken
-from django.conf import settings
-from rest_framework import authentication
+# Marks a request whose authentication has not been resolved yet
+_UNRESOLVED = object()
 
 
-import logging
+def claims_mode_allowed():
+    """
+    Whether access token claims may stand in for the user row: only while
+    access tokens expire soon enough for a role or flag change to reach them.
+    """
+    return settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'] <= settings.AUTH_TOKEN_CLAIMS_MAX_LIFETIME
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry the identity fields most
+    endpoints need, so AUTH_TOKEN_CLAIMS mode can build request.user without
+    a database read.
+
+    The claims are taken from `user`, a row loaded when the access token is
+    made, and never stored in the refresh token itself: it outlives any role
+    or flag, so copying claims from it would keep a demoted or deactivated
+    user's old access alive.
+    """
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        # Tokens issued before claims were kept out still carry them
+        for name in TokenClaimsUser.CLAIM_FIELDS:
+            self.payload.pop(name, None)
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.user = user
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        if self.user is not None:
+            for name in TokenClaimsUser.CLAIM_FIELDS:
+                access[name] = getattr(self.user, name)
+        return access
 
-logger = logging.getLogger('django.auth')
 
 class JWTCookieAuthentication(BaseJWTAuthentication):
     """
-    Custom JWT authentication class that reads tokens from cookies
-    instead of Authorization header
+    Single-pass JWT authentication for both the httpOnly access_token cookie
+    and the Authorization header.
+
+    The cookie is tried first. An invalid cookie never blocks the request; the
+    header is tried next, and an invalid header token is rejected just like the
+    stock simplejwt class does. Each raw token is decoded at most once, and the
+    outcome is stored on the request so that authenticating the same request
+    again is free.
     """
-    
+
     def authenticate(self, request):
-        # Log headers to debug CORS issues
-        logger.debug(f"Auth request headers: {request.headers}")
-        logger.debug(f"Auth request COOKIES: {request.COOKIES}")
-        
-        # First try to get token from cookie
-        raw_token = request.COOKIES.get('access_token')
-        
+        django_request = getattr(request, '_request', request)
+        result = getattr(django_request, '_jwt_auth_result', _UNRESOLVED)
+        if result is _UNRESOLVED:
+            result = self._authenticate(request)
+            django_request._jwt_auth_result = result
+        return result
+
+    def _authenticate(self, request):
+        cookie_token = request.COOKIES.get(getattr(settings, 'JWT_AUTH_COOKIE', 'access_token'))
+        cookie_error = None
+        if cookie_token:
+            try:
+                validated_token = self.get_validated_token(cookie_token)
+                user = self.get_user(validated_token)
+                logger.debug("Authenticated user %s from cookie", user.pk)
+                return user, validated_token
+            except (InvalidToken, AuthenticationFailed) as e:
+                cookie_error = e
+                logger.info("Ignoring invalid access_token cookie: %s", e)
+            except Exception:
+                logger.exception("Unexpected error in JWTCookieAuthentication")
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
         if raw_token is None:
-            logger.debug("No access_token cookie found, falling back to header auth")
-            # If not in cookie, fall back to header authentication
-            return super().authenticate(request)
-            
-        try:
-            # Validate and decode the token
-            validated_token = self.get_validated_token(raw_token)
-            
-            # Get the user from the validated token
-            user = self.get_user(validated_token)
-            logger.debug(f"Successfully authenticated user {user.username} from cookie")
-            
-            return user, validated_token
-        except InvalidToken as e:
-            # Log the token validation error
-            logger.error(f"Token validation error: {e}")
             return None
-        except Exception as e:
-            # Catch other unexpected errors
-            logger.error(f"Unexpected error in JWTCookieAuthentication: {e}")
-            return None
\ No newline at end of file
+        if cookie_error is not None and raw_token.decode() == cookie_token:
+            # Clients with cookie trouble send the same token in both places; don't decode it twice
+            raise cookie_error
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        logger.debug("Authenticated user %s from Authorization header", user.pk)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        """
+        Same checks as simplejwt's get_user, but the user row comes from the
+        short-TTL user cache instead of a query on every request. In
+        AUTH_TOKEN_CLAIMS mode the user is built from the token claims alone.
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if (getattr(settings, 'AUTH_TOKEN_CLAIMS', False) and not api_settings.CHECK_REVOKE_TOKEN
+                and claims_mode_allowed()
+                and all(name in validated_token for name in TokenClaimsUser.CLAIM_FIELDS)):
+            user = TokenClaimsUser.from_claims(user_id, validated_token)
+            if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            return user
+
+        user = user_cache.get_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    """
+    Authenticate with either a username or an email address.
+
+    The user is resolved in a single query that hits the username index or
+    the case-insensitive email index, and the password hasher runs exactly
+    once per attempt, including for unknown users, so a login costs the same
+    whichever identifier is used or whether the account exists.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD) or kwargs.get('email')
+        if username is None or password is None:
+            return None
+
+        # The email index is partial (non-empty emails); repeating its condition lets it be used
+        candidates = list(
+            UserModel._default_manager.alias(email_lower=Lower('email'))
+            .filter(Q(username=username) | (Q(email_lower=username.lower()) & ~Q(email='')))[:2]
+        )
+        # An exact username match wins over another account's email
+        user = next((u for u in candidates if u.username == username), candidates[0] if candidates else None)
+
+        if user is None:
+            # Run the hasher anyway to keep the timing of unknown users the same
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
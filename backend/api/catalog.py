@@ -0,0 +1,140 @@
+"""
+Catalog versions for conditional GETs.
+
+Each scope ('catalog' for universities and courses, 'feedback' for the
+featured feedback) has a version and a last-modified time, which every
+process must agree on. For 'catalog' they are the CatalogVersion row kept by
+api/catalog_changes.py, so a write from any process (a web worker, the
+course loader, a cron job) moves them. For 'feedback' they are a stamp and a
+time in the shared cache, replaced by signals.
+
+`conditional` turns them into ETag and Last-Modified headers, reading them
+once per request, so a client revalidating an unchanged resource gets a 304
+after that one lookup, before the view runs any query or serializer. The
+ETag also covers the Accept header, which picks between the JSON and binary
+encodings of the same data. `cache_vary` puts the same version into the
+keys of api/tiered_cache.py responses, so a body cached under an older
+version is never sent with a newer ETag.
+
+Invalidating a scope drops the tiered-cache entries tagged with it; the
+signals do that once the change has committed.
+"""
+import hashlib
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import caches
+from django.db.models import Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import catalog_changes
+from .tiered_cache import tiered
+
+
+def _stamp_key(scope):
+    return f'{scope}_version'
+
+
+def _modified_key(scope):
+    return f'{scope}_modified'
+
+
+def _last_change(scope):
+    from .models import Course, University
+    if scope == 'catalog':
+        latest = [model.objects.aggregate(latest=Max('updated_at'))['latest'] for model in (University, Course)]
+        latest = [value.timestamp() for value in latest if value is not None]
+        if latest:
+            return max(latest)
+    # Feedback keeps no modification time; claim nothing older than now
+    return time.time()
+
+
+def _read_state(scope):
+    if scope == 'catalog':
+        from .models import CatalogVersion
+        row = CatalogVersion.objects.filter(scope=catalog_changes.CATALOG).values_list('version', 'updated_at').first()
+        if row is None:
+            # Nothing has changed since change tracking began
+            return '0', _last_change(scope)
+        return str(row[0]), row[1].timestamp()
+
+    shared = caches['shared']
+    keys = [_stamp_key(scope), _modified_key(scope)]
+    found = shared.get_many(keys)
+    if len(found) < len(keys):
+        # First use, or evicted; add() so racing processes agree
+        shared.add(_stamp_key(scope), uuid.uuid4().hex, None)
+        shared.add(_modified_key(scope), _last_change(scope), None)
+        found = shared.get_many(keys)
+    return found[_stamp_key(scope)], found[_modified_key(scope)]
+
+
+def state(scope, request=None):
+    """(version, last change as a Unix timestamp) of the scope, read once per request"""
+    if request is None:
+        return _read_state(scope)
+    # DRF wraps the request conditional() sees; memoize on the Django one
+    request = getattr(request, '_request', request)
+    memo = request.__dict__.setdefault('_catalog_state', {})
+    if scope not in memo:
+        memo[scope] = _read_state(scope)
+    return memo[scope]
+
+
+def invalidate(scope, *tags):
+    """
+    Drop tiered-cache entries tagged with the scope or any of `tags`, and
+    move a cache-stamped scope to a new version. The catalog's version is
+    moved by api/catalog_changes.py itself.
+    """
+    if scope != 'catalog':
+        caches['shared'].set_many({_stamp_key(scope): uuid.uuid4().hex, _modified_key(scope): time.time()}, None)
+    tiered.invalidate(scope, *tags)
+
+
+def version(scope, request=None):
+    return state(scope, request)[0]
+
+
+def last_modified(scope, request=None):
+    """Time of the scope's last change, as a Unix timestamp"""
+    return state(scope, request)[1]
+
+
+def cache_vary(scope):
+    """`vary` for cached_response on a view whose data depends on `scope`"""
+    return lambda request, *args, **kwargs: f'{scope}={version(scope, request)}'
+
+
+def _accept_tag(request):
+    """Short tag for the Accept header, since it selects the response format"""
+    return hashlib.md5(request.headers.get('Accept', '').encode()).hexdigest()[:8]
+
+
+def conditional(scope):
+    """
+    Decorate a view (above @api_view) whose GET response depends only on
+    `scope` and the URL, so it can be revalidated cheaply.
+    """
+    def decorator(view):
+        checked = condition(
+            etag_func=lambda request, *args, **kwargs: f'{scope}-{version(scope, request)}-{_accept_tag(request)}',
+            last_modified_func=lambda request, *args, **kwargs: datetime.fromtimestamp(
+                last_modified(scope, request), tz=timezone.utc
+            )
+        )(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = checked(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+                # Caches may keep the body but must revalidate it on every use
+                patch_cache_control(response, no_cache=True)
+                patch_vary_headers(response, ('Accept',))
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,181 @@
+"""
+Change tracking for the university and course catalog.
+
+Every write to a University or Course moves the catalog to a new version:
+a monotonic integer kept in the CatalogVersion table under 'catalog'. Each
+university touched by the write records that same number under
+'university:<id>', so a university's version is the catalog version of its
+last change, and a client holding catalog version N knows a university has
+changed since if its version is above N. Reading either is one primary-key
+lookup (`current_version()`, `university_versions()`).
+
+Single-row saves and deletes are reported by the signals in api/signals.py.
+Bulk writes (QuerySet.update(), bulk_create(), bulk_update() and delete(),
+which the admin's delete action uses) are reported by CatalogQuerySet in
+api/models.py. Within `batch()` the changes are collected and recorded as one
+version when the block exits, in the same transaction as the writes; the
+bulk methods, University.delete() and the course loader all use it.
+
+Each version also updates the CatalogChange log, which holds the version
+of the latest change to every row and a tombstone for every deleted one.
+`changes_since()` reads it through its version index, so a client holding
+version N fetches only what changed after N.
+
+Each recorded version is announced in-process through the `catalog_changed`
+signal, with the version, the affected universities and the list of
+changes, so caches and indexes can drop exactly what changed. Like
+post_save, it is sent before the transaction commits; receivers that
+invalidate caches or rebuild from the database should defer that work with
+transaction.on_commit(), or another process could cache the old rows again.
+"""
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+CATALOG = 'catalog'
+
+# `model` is the model name ('university' or 'course'); `pk` is None for rows
+# created by bulk_create(ignore_conflicts=True), whose ids are not known
+Change = namedtuple('Change', 'model pk university_id deleted')
+
+# Sent with version, universities ({id: version}) and changes ([Change])
+catalog_changed = Signal()
+
+_state = threading.local()
+
+
+def university_scope(university_id):
+    return f'university:{university_id}'
+
+
+def current_version():
+    from .models import CatalogVersion
+    return CatalogVersion.objects.filter(scope=CATALOG).values_list('version', flat=True).first() or 0
+
+
+def university_versions(university_ids):
+    """Version of each of the given universities; 0 for one never changed since tracking began"""
+    from .models import CatalogVersion
+    scopes = {university_scope(pk): pk for pk in university_ids}
+    found = dict(CatalogVersion.objects.filter(scope__in=scopes).values_list('scope', 'version'))
+    return {pk: found.get(scope, 0) for scope, pk in scopes.items()}
+
+
+def _record(changes, universities):
+    from .models import CatalogVersion
+    scopes = [university_scope(pk) for pk in universities]
+    with transaction.atomic():
+        CatalogVersion.objects.bulk_create(
+            [CatalogVersion(scope=scope) for scope in [CATALOG, *scopes]], ignore_conflicts=True
+        )
+        # The update locks the row, so concurrent writers get consecutive versions
+        now = timezone.now()
+        CatalogVersion.objects.filter(scope=CATALOG).update(version=F('version') + 1, updated_at=now)
+        version = CatalogVersion.objects.values_list('version', flat=True).get(scope=CATALOG)
+        if scopes:
+            CatalogVersion.objects.filter(scope__in=scopes).update(version=version, updated_at=now)
+        _log(changes, version)
+        catalog_changed.send(
+            sender=CatalogVersion, version=version,
+            universities=dict.fromkeys(universities, version), changes=changes,
+        )
+    return version
+
+
+def _log(changes, version):
+    from .models import CatalogChange, Course, University
+    models = {'university': University, 'course': Course}
+    rows = {}
+    for change in changes:
+        if change.pk is not None:
+            rows[(change.model, change.pk)] = (change.university_id, change.deleted)
+        else:
+            # Rows created with ignore_conflicts carry no id: log the university's rows instead
+            lookup = 'pk' if change.model == 'university' else 'university_id'
+            for pk in models[change.model].objects.filter(**{lookup: change.university_id}).values_list('pk', flat=True):
+                rows.setdefault((change.model, pk), (change.university_id, False))
+    CatalogChange.objects.bulk_create(
+        [CatalogChange(model=model, object_id=pk, university_id=university_id, version=version, deleted=deleted)
+         for (model, pk), (university_id, deleted) in rows.items()],
+        update_conflicts=True, unique_fields=['model', 'object_id'],
+        update_fields=['university_id', 'version', 'deleted'], batch_size=500,
+    )
+
+
+def changes_since(since, limit):
+    """
+    Rows created or updated after version `since`, and the ids of those
+    deleted since, as {'version', 'more', 'universities', 'courses',
+    'deleted': {'universities', 'courses'}}. At most about `limit` rows
+    are returned, never splitting a version; with `more` set, the client
+    asks again from the returned version.
+    """
+    from .models import CatalogChange
+    from .projections import CourseProjection, UniversityProjection
+    # Read first: rows logged after it are returned again next time, never missed
+    version = current_version()
+    log = CatalogChange.objects.filter(version__gt=since).order_by('version')
+    page = list(log.values_list('model', 'object_id', 'version', 'deleted')[:limit + 1])
+    more = len(page) > limit
+    if more:
+        cut = page[limit][2]
+        page = [entry for entry in page if entry[2] < cut] or list(
+            log.filter(version=cut).values_list('model', 'object_id', 'version', 'deleted')
+        )
+        version = page[-1][2]
+    elif page:
+        version = max(version, page[-1][2])
+
+    ids = {(model, deleted): [] for model in ('university', 'course') for deleted in (False, True)}
+    for model, pk, _, deleted in page:
+        ids[(model, deleted)].append(pk)
+    universities = UniversityProjection(expand=())
+    courses = CourseProjection()
+    return {
+        'version': version,
+        'more': more,
+        'universities': universities.data(universities.queryset().filter(pk__in=ids[('university', False)]))
+        if ids[('university', False)] else [],
+        'courses': courses.data(courses.queryset().filter(pk__in=ids[('course', False)]))
+        if ids[('course', False)] else [],
+        'deleted': {'universities': ids[('university', True)], 'courses': ids[('course', True)]},
+    }
+
+
+def track(model, pk, university_id, deleted=False, previous_university_id=None):
+    """
+    Report a write to one catalog row. `previous_university_id` is the
+    course's university before a move, which has changed as well.
+    """
+    change = Change(model._meta.model_name, pk, university_id, deleted)
+    universities = {uid for uid in (university_id, previous_university_id) if uid is not None}
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        _record([change], universities)
+        return
+    changes, touched = pending
+    # The latest write to a row is the one that counts
+    changes[(change.model, pk) if pk is not None else change] = change
+    touched.update(universities)
+
+
+@contextmanager
+def batch():
+    """Record every change made in the block as a single version, atomically with the writes"""
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+    _state.pending = ({}, set())
+    try:
+        with transaction.atomic():
+            yield
+            (changes, universities), _state.pending = _state.pending, None
+            if changes:
+                _record(list(changes.values()), universities)
+    finally:
+        _state.pending = None
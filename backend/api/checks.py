@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.security)
+def check_token_claims(app_configs, **kwargs):
+    from .authentication import claims_mode_allowed
+    if getattr(settings, 'AUTH_TOKEN_CLAIMS', False) and not claims_mode_allowed():
+        return [Error(
+            "AUTH_TOKEN_CLAIMS needs short-lived access tokens.",
+            hint=(
+                "Claims are only refreshed when a token is issued, so role and staff changes would not "
+                "take effect for SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']; lower it to at most "
+                "AUTH_TOKEN_CLAIMS_MAX_LIFETIME or turn AUTH_TOKEN_CLAIMS off."
+            ),
+            id='api.E001',
+        )]
+    return []
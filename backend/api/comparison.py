@@ -0,0 +1,78 @@
+"""
+Side-by-side course comparison for /api/courses/batch/.
+
+Durations are free text ("4 years", "3-5 years", "12 weeks"), so they are
+normalized to months here; a range counts as its lower bound, the shortest
+way through the course. Fees are compared against the cheapest course in
+the set.
+"""
+import re
+from decimal import Decimal
+
+from django.conf import settings
+
+from .projections import CourseProjection
+from .tiered_cache import tiered
+
+MONTHS_PER_UNIT = {
+    'year': 12, 'yr': 12,
+    'semester': 6,
+    'term': 4, 'trimester': 4, 'quarter': 3,
+    'month': 1,
+    'week': Decimal(12) / 52,
+}
+
+DURATION = re.compile(r'(\d+(?:\.\d+)?)\s*(?:(?:-|to|–)\s*\d+(?:\.\d+)?\s*)?([a-z]+)', re.IGNORECASE)
+
+
+def duration_months(duration):
+    """Months in a duration string, or None when it cannot be read"""
+    match = DURATION.search(duration or '')
+    if not match:
+        return None
+    unit = match.group(2).lower().rstrip('s')
+    if unit not in MONTHS_PER_UNIT:
+        return None
+    months = Decimal(match.group(1)) * MONTHS_PER_UNIT[unit]
+    return float(round(months, 1))
+
+
+def compare(courses):
+    """
+    Add `duration_months` and `fee_delta` (the difference from the cheapest
+    course, in the same string form as `fees`) to each course dict, and
+    return a summary naming the cheapest and shortest courses.
+    """
+    fees = {course['id']: Decimal(course['fees']) for course in courses}
+    cheapest = min(fees.values(), default=None)
+    for course in courses:
+        course['duration_months'] = duration_months(course['duration'])
+        course['fee_delta'] = f'{fees[course["id"]] - cheapest:f}'
+
+    timed = [course for course in courses if course['duration_months'] is not None]
+    return {
+        'cheapest': min(courses, key=lambda course: fees[course['id']])['id'] if courses else None,
+        'shortest': min(timed, key=lambda course: course['duration_months'])['id'] if timed else None,
+    }
+
+
+def course_batch(ids, version):
+    """
+    Comparison payload for the courses with the given ids, in that order.
+    The payload is cached per set of ids and catalog `version`, so any
+    order of the same ids shares an entry until the catalog changes.
+    """
+    def compute():
+        courses = CourseProjection().data(CourseProjection().queryset().filter(pk__in=ids))
+        return {'courses': courses, 'comparison': compare(courses)}
+    payload = tiered.get_or_compute(
+        f'course_batch:{version}:' + ','.join(map(str, sorted(ids))), compute,
+        getattr(settings, 'COURSE_BATCH_CACHE_TTL', 3600), tags=['catalog']
+    )
+
+    found = {course['id']: course for course in payload['courses']}
+    return {
+        'courses': [found[pk] for pk in ids if pk in found],
+        'missing': [pk for pk in ids if pk not in found],
+        'comparison': payload['comparison'],
+    }
@@ -0,0 +1,173 @@
+"""
+Profile picture processing.
+
+An upload is decoded once (JPEGs are decoded straight at reduced scale),
+rotated according to its EXIF orientation and cropped to a square. Fixed-size
+variants are then encoded in WebP and JPEG on a shared thread pool; Pillow
+releases the GIL while encoding, so they are produced in parallel. No EXIF,
+ICC or other metadata is written to the variants.
+
+Variants are stored as `avatars/<hash>_<size>.<ext>`, where the hash covers
+the uploaded bytes and PIPELINE_VERSION. A name therefore always refers to
+the same content, and identical uploads (such as a stock avatar picked by
+many users) are processed and stored once. Each hash has a MediaBlob whose
+reference count is the number of profiles using it; `collect_garbage`
+deletes the files of hashes that have been unreferenced for a while.
+"""
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import MediaBlob
+from .storage import ContentAddressedStorage
+
+# Bump when the output of the pipeline changes, so new uploads get new names
+PIPELINE_VERSION = 1
+
+AVATAR_DIR = 'avatars'
+AVATAR_SIZES = (48, 128, 512)
+AVATAR_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DEFAULT_AVATAR_FORMAT = 'webp'
+# Variant served when a serializer is not asked for a particular size
+DEFAULT_AVATAR_SIZE = 128
+
+# Uploads with more pixels than this are rejected before being decoded
+MAX_SOURCE_PIXELS = 40_000_000
+
+avatar_storage = ContentAddressedStorage()
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'AVATAR_WORKERS', 4), thread_name_prefix='avatar')
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def avatar_name(avatar_hash, size, ext=DEFAULT_AVATAR_FORMAT):
+    return f'{AVATAR_DIR}/{avatar_hash}_{size}.{ext}'
+
+
+def avatar_names(avatar_hash):
+    return [avatar_name(avatar_hash, size, ext) for size in AVATAR_SIZES for ext in AVATAR_FORMATS]
+
+
+def pick_size(size):
+    """The smallest variant at least `size` pixels wide, or the largest one"""
+    return next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+
+
+def _decode(data):
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_SOURCE_PIXELS:
+            raise InvalidImage('Image is too large')
+        # Let the JPEG decoder downscale by up to 8x while decoding
+        image.draft('RGB', (AVATAR_SIZES[-1], AVATAR_SIZES[-1]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Flatten transparency onto white, since JPEG has no alpha
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        return image.convert('RGB')
+    except InvalidImage:
+        raise
+    except Exception as e:
+        raise InvalidImage(f'Not a valid image: {e}')
+
+
+def _encode(image, ext):
+    fmt, options = AVATAR_FORMATS[ext]
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def render_avatar(data):
+    """
+    Turn uploaded image bytes into {(size, ext): encoded bytes} for every
+    variant. Raises InvalidImage if the data cannot be decoded.
+    """
+    image = _decode(data)
+    # Crop once at the largest size; smaller variants are resized from it
+    largest = ImageOps.fit(image, (AVATAR_SIZES[-1],) * 2, Image.LANCZOS)
+    scaled = {size: largest if size == AVATAR_SIZES[-1] else largest.resize((size, size), Image.LANCZOS)
+              for size in AVATAR_SIZES}
+    futures = {(size, ext): _executor.submit(_encode, scaled[size], ext)
+               for size in AVATAR_SIZES for ext in AVATAR_FORMATS}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def store_avatar(upload):
+    """
+    Process an uploaded file, store its variants unless an identical upload
+    already did, and take a reference to them. Returns the avatar hash to
+    keep on the profile; call release_avatar when the profile lets go of it.
+
+    A MediaBlob row is only committed once all of its files are written, so
+    a reference taken to an existing row always finds them. The files are
+    written while this upload holds the uncommitted row, which makes an
+    identical upload arriving meanwhile wait for it; if writing fails, the
+    files can be removed before anyone else can refer to them.
+    """
+    data = upload.read()
+    avatar_hash = hashlib.sha256(b'%d:' % PIPELINE_VERSION + data).hexdigest()[:32]
+    if _take_reference(avatar_hash):
+        return avatar_hash
+    # Rendered before taking any lock; raises InvalidImage with nothing stored
+    variants = render_avatar(data)
+    with transaction.atomic():
+        blob, created = MediaBlob.objects.select_for_update().get_or_create(key=avatar_hash)
+        if created:
+            written = []
+            try:
+                for (size, ext), content in variants.items():
+                    written.append(avatar_storage.save(avatar_name(avatar_hash, size, ext), ContentFile(content)))
+            except Exception:
+                for name in written:
+                    avatar_storage.delete(name)
+                raise
+        _take_reference(avatar_hash)
+    return avatar_hash
+
+
+def _take_reference(avatar_hash):
+    return MediaBlob.objects.filter(pk=avatar_hash).update(refcount=F('refcount') + 1, updated_at=timezone.now())
+
+
+def release_avatar(avatar_hash):
+    MediaBlob.objects.filter(pk=avatar_hash, refcount__gt=0).update(
+        refcount=F('refcount') - 1, updated_at=timezone.now()
+    )
+
+
+def collect_garbage(grace=None):
+    """
+    Delete the files of avatars nobody has referenced for `grace` (default
+    MEDIA_GC_GRACE). Returns the number of avatars deleted.
+    """
+    grace = grace if grace is not None else getattr(settings, 'MEDIA_GC_GRACE', timedelta(hours=1))
+    cutoff = timezone.now() - grace
+    deleted = 0
+    for key in MediaBlob.objects.filter(refcount=0, updated_at__lt=cutoff).values_list('pk', flat=True):
+        # Deleting the row first locks it (and on SQLite the database) until the
+        # files are gone, so a concurrent upload of the same picture waits and
+        # then renders it afresh. One that took a reference already keeps it.
+        with transaction.atomic():
+            if MediaBlob.objects.filter(pk=key, refcount=0).delete()[0]:
+                for name in avatar_names(key):
+                    avatar_storage.delete(name)
+                deleted += 1
+    return deleted
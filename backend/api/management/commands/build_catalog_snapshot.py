@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.snapshots import build
+
+
+class Command(BaseCommand):
+    help = 'Render the catalog into a precompressed snapshot for cold-start clients (e.g. after a deploy)'
+
+    def handle(self, *args, **options):
+        manifest = build()
+        self.stdout.write(self.style.SUCCESS(
+            f"Built catalog snapshot {manifest['hash']} at version {manifest['version']}: {', '.join(manifest['files'].values())}"
+        ))
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from api.images import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete media files no profile has referenced for a while (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, help='Seconds a file must have been unreferenced (default: MEDIA_GC_GRACE)')
+
+    def handle(self, *args, **options):
+        grace = timedelta(seconds=options['grace']) if options['grace'] is not None else None
+        deleted = collect_garbage(grace)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unreferenced avatars'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.notifications import send_digests
+
+
+class Command(BaseCommand):
+    help = 'Send pending notification digests to users who opted into them (run periodically, e.g. from cron)'
+
+    def handle(self, *args, **kwargs):
+        sent = send_digests()
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} notification digests'))
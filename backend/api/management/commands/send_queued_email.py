@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api.outbox import drain
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox email (run periodically, e.g. from cron, or continuously with --interval)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Messages sent per SMTP connection (default: OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--interval', type=float, help='Keep running, draining the outbox every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain(options['batch_size'])
+            if sent or failed or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} queued emails, {failed} failed'))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
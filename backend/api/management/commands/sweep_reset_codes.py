@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.models import PasswordResetCode
+
+
+class Command(BaseCommand):
+    help = 'Delete expired password reset codes in batches (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per query')
+
+    def handle(self, *args, **options):
+        deleted = PasswordResetCode.sweep_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired reset codes'))
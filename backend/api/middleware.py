@@ -0,0 +1,182 @@
+"""
+Response compression.
+
+CompressionMiddleware compresses structured responses (JSON, MessagePack,
+HTML, ...) with the best encoding the client accepts: brotli or zstd when the
+`brotli` or `zstandard` package is installed, gzip otherwise. Bodies smaller
+than COMPRESSION_MIN_SIZE are sent as-is. Streaming responses are compressed
+chunk by chunk and flushed after each chunk, so clients still see every
+chunk as soon as it is produced.
+
+Compressed bodies of responses that carry an ETag are cached for
+COMPRESSION_CACHE_TTL seconds, keyed by URL, content type, ETag and encoding.
+The hot catalog payloads, whose ETags only change with the catalog, are then
+compressed once rather than on every request.
+"""
+import hashlib
+import re
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/(?!event-stream)|application/(json|javascript|xml|msgpack|cbor|[\w.+-]+\+json|[\w.+-]+\+xml)|image/svg\+xml)'
+)
+
+
+class GzipCodec:
+    name = 'gzip'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def _compressor(self):
+        # wbits=31 writes the gzip container rather than raw zlib
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        compressor = self._compressor()
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self, chunks):
+        compressor = self._compressor()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class BrotliCodec:
+    name = 'br'
+
+    def __init__(self, quality=5):
+        self.quality = quality
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.quality)
+
+    def stream(self, chunks):
+        compressor = brotli.Compressor(quality=self.quality)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class ZstdCodec:
+    name = 'zstd'
+
+    def __init__(self, level=3):
+        self.level = level
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def available_codecs():
+    """Codecs usable in this environment, most preferred first"""
+    codecs = []
+    if brotli is not None:
+        codecs.append(BrotliCodec())
+    if zstandard is not None:
+        codecs.append(ZstdCodec())
+    codecs.append(GzipCodec())
+    return codecs
+
+
+def parse_accept_encoding(header):
+    """Map each encoding in an Accept-Encoding header to its q-value"""
+    accepted = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        match = re.search(r'q=([\d.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.codecs = available_codecs()
+
+    def choose_codec(self, request):
+        accepted = parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+        wildcard = accepted.get('*', 0)
+        candidates = [(accepted.get(codec.name, wildcard), -index, codec) for index, codec in enumerate(self.codecs)]
+        q, _, codec = max(candidates, key=lambda candidate: candidate[:2])
+        return codec if q > 0 else None
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding') or response.status_code not in (200, 203, 404, 410):
+            return response
+        # Content-Range counts bytes of the uncompressed file
+        if response.has_header('Content-Range'):
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codec = self.choose_codec(request)
+        if codec is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = codec.stream(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            response.content = self.compressed_content(request, response, codec)
+            response['Content-Length'] = str(len(response.content))
+
+        # The representation changed, so a strong validator no longer holds
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = codec.name
+        return response
+
+    def compressed_content(self, request, response, codec):
+        etag = response.get('ETag')
+        if not etag:
+            return codec.compress(response.content)
+        key = 'compressed:' + hashlib.sha1(
+            '\n'.join([request.get_full_path(), response['Content-Type'], etag, codec.name]).encode()
+        ).hexdigest()
+        content = cache.get(key)
+        if content is None:
+            content = codec.compress(response.content)
+            cache.set(key, content, getattr(settings, 'COMPRESSION_CACHE_TTL', 300))
+        return content
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:41
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def dedupe_emails(apps, schema_editor):
+    """
+    Emails used to be unique only case-sensitively. Where several accounts
+    share one case-insensitively, the most recently active keeps it and the
+    others have theirs cleared (listed below), so the constraint can be added.
+    """
+    CustomUser = apps.get_model('api', 'CustomUser')
+    users = (
+        CustomUser.objects.exclude(email='').annotate(email_lower=Lower('email'))
+        .order_by('email_lower', models.F('last_login').desc(nulls_last=True), '-date_joined', 'pk')
+        .values_list('pk', 'username', 'email', 'email_lower')
+    )
+    seen, cleared = set(), []
+    for pk, username, email, email_lower in users.iterator():
+        if email_lower in seen:
+            cleared.append((pk, username, email))
+        seen.add(email_lower)
+    if cleared:
+        CustomUser.objects.filter(pk__in=[pk for pk, _, _ in cleared]).update(email='')
+        print(f"\n  Cleared duplicate emails (case-insensitive) on {len(cleared)} accounts:")
+        for pk, username, email in cleared:
+            print(f"    {pk} {username} <{email}>")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_tokenclaimsuser'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='unique_user_email_ci'),
+        ),
+    ]
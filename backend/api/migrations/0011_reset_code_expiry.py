@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:46
+
+import api.models
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_expires_at(apps, schema_editor):
+    PasswordResetCode = apps.get_model('api', 'PasswordResetCode')
+    PasswordResetCode.objects.update(expires_at=models.F('created_at') + timedelta(minutes=15))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passwordresetcode',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='passwordresetcode',
+            name='expires_at',
+            field=models.DateTimeField(default=api.models.default_reset_code_expiry),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='passwordresetcode',
+            index=models.Index(fields=['user', 'code', 'expires_at'], name='api_passwor_user_id_f90d34_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetcode',
+            index=models.Index(fields=['expires_at'], name='api_passwor_expires_cafb57_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def move_legacy_images(apps, schema_editor):
+    UserProfile = apps.get_model('api', 'UserProfile')
+    UserProfile.objects.filter(profile_picture__in=['', None]).exclude(image__in=['', None]).update(
+        profile_picture=models.F('image')
+    )
+
+
+def count_avatar_references(apps, schema_editor):
+    UserProfile = apps.get_model('api', 'UserProfile')
+    MediaBlob = apps.get_model('api', 'MediaBlob')
+    counts = UserProfile.objects.exclude(avatar_hash='').values('avatar_hash').annotate(n=models.Count('pk'))
+    MediaBlob.objects.bulk_create([MediaBlob(key=row['avatar_hash'], refcount=row['n']) for row in counts])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_userprofile_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_legacy_images, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='image',
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refcount', 'updated_at'], name='api_mediabl_refcoun_63155d_idx')],
+            },
+        ),
+        migrations.RunPython(count_avatar_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+def log_existing_catalog(apps, schema_editor):
+    # Gives the rows that predate the change log a version, so a sync from 0 includes them
+    University = apps.get_model('api', 'University')
+    Course = apps.get_model('api', 'Course')
+    CatalogVersion = apps.get_model('api', 'CatalogVersion')
+    CatalogChange = apps.get_model('api', 'CatalogChange')
+    universities = list(University.objects.values_list('pk', flat=True))
+    if not universities:
+        return
+    catalog, _ = CatalogVersion.objects.get_or_create(scope='catalog')
+    catalog.version += 1
+    catalog.save()
+    CatalogChange.objects.bulk_create(
+        [CatalogChange(model='university', object_id=pk, university_id=pk, version=catalog.version) for pk in universities]
+        + [CatalogChange(model='course', object_id=pk, university_id=university_id, version=catalog.version)
+           for pk, university_id in Course.objects.values_list('pk', 'university_id')],
+        batch_size=500,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_catalog_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('university_id', models.BigIntegerField()),
+                ('version', models.PositiveBigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['version'], name='api_catalog_version_7f2d29_idx')],
+                'constraints': [models.UniqueConstraint(fields=('model', 'object_id'), name='unique_catalog_change_row')],
+            },
+        ),
+        migrations.RunPython(log_existing_catalog, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import timedelta
 
+from . import catalog_changes
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
         ('student', 'Student'),
@@ -10,6 +14,14 @@ class CustomUser(AbstractUser):
         ('superuser_admin', 'Superuser Admin'),
     ]
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
+    # Receive a periodic digest instead of one notification per event
+    notification_digest = models.BooleanField(default=False)
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Also serves as the index for case-insensitive email logins
+            models.UniqueConstraint(Lower('email'), name='unique_user_email_ci', condition=~models.Q(email='')),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -26,6 +38,56 @@ class CustomUser(AbstractUser):
     def is_superuser_admin(self):
         return self.role == 'superuser_admin' or self.is_superuser
 
+class TokenClaimsUser(CustomUser):
+    """
+    A CustomUser built from access token claims without a database read.
+    Only the claim-backed fields are loaded; touching any other field loads
+    the rest of the row in one go (from the auth user cache when possible).
+
+    The claims are as old as the token, so save() writes back only the
+    claim fields the caller changed; a role or flag revoked since the token
+    was issued is never restored by an unrelated save.
+    """
+    CLAIM_FIELDS = ['username', 'role', 'is_staff', 'is_superuser', 'is_active']
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, claims):
+        from django.db import router
+        values = dict({name: claims[name] for name in cls.CLAIM_FIELDS}, id=user_id)
+        # from_db expects values in concrete field order
+        field_names = [f.attname for f in cls._meta.concrete_fields if f.attname in values]
+        user = cls.from_db(router.db_for_read(cls), field_names, [values[name] for name in field_names])
+        user._claims = {name: values[name] for name in cls.CLAIM_FIELDS}
+        return user
+
+    def save(self, **kwargs):
+        claims = getattr(self, '_claims', None)
+        if claims is not None and not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                # Same default as Model.save() for a partly loaded instance
+                deferred = self.get_deferred_fields()
+                update_fields = [f.attname for f in self._meta.concrete_fields
+                                 if not f.primary_key and f.attname not in deferred]
+            unchanged = {name for name, value in claims.items() if getattr(self, name) == value}
+            kwargs['update_fields'] = [name for name in update_fields if name not in unchanged]
+        super().save(**kwargs)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            from .user_cache import get_user
+            user = get_user(self.pk)
+            if user is None:
+                raise CustomUser.DoesNotExist("User in token no longer exists")
+            for name in deferred:
+                setattr(self, name, getattr(user, name))
+            return
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
 class Submission(models.Model):
     username = models.CharField(max_length=100)
     password = models.CharField(max_length=100)  # For demo only; don't store plain passwords in real apps!
@@ -34,42 +96,179 @@ class Submission(models.Model):
 class UserProfile(models.Model):
     user = models.OneToOneField('CustomUser', on_delete=models.CASCADE, related_name='profile')
     created_at = models.DateTimeField(auto_now_add=True)
-    image = models.ImageField(upload_to='profile_pics/', null=True, blank=True)  # Legacy field, use profile_picture instead
+    # Original upload from before pictures were processed; new uploads only set avatar_hash
     profile_picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
     bio = models.TextField(max_length=140, blank=True, null=True)
+    # Names the processed variants of the current picture (see api/images.py)
+    avatar_hash = models.CharField(max_length=32, blank=True)
 
     def __str__(self):
         return f"{self.user.username}'s profile"
-        
-    def save(self, *args, **kwargs):
-        # Ensure the media directories exist
-        import os
-        from django.conf import settings
-        
-        if not os.path.exists(settings.MEDIA_ROOT):
-            os.makedirs(settings.MEDIA_ROOT)
-            
-        profile_pics_dir = os.path.join(settings.MEDIA_ROOT, 'profile_pics')
-        if not os.path.exists(profile_pics_dir):
-            os.makedirs(profile_pics_dir)
-            
-        super().save(*args, **kwargs)
+
+class MediaBlob(models.Model):
+    """
+    Reference count for a set of content-addressed media files, such as the
+    variants of one avatar. Blobs left unreferenced for a while are deleted,
+    files included, by `manage.py collect_media_garbage`.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['refcount', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.refcount} references)"
+
+def default_reset_code_expiry():
+    return timezone.now() + getattr(settings, 'PASSWORD_RESET_CODE_TTL', timedelta(minutes=15))
 
 class PasswordResetCode(models.Model):
     user = models.ForeignKey('CustomUser', on_delete=models.CASCADE)
     code = models.CharField(max_length=6)  # 6-digit verification code
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_reset_code_expiry)
+    # Wrong codes tried while this one was live; it stops working at PASSWORD_RESET_MAX_ATTEMPTS
+    attempts = models.PositiveSmallIntegerField(default=0)
     is_used = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Lets verification find a live code with a single index lookup
+            models.Index(fields=['user', 'code', 'expires_at']),
+            models.Index(fields=['expires_at']),
+        ]
+    
     def __str__(self):
         return f"Reset code for {self.user.username}"
     
     def is_expired(self):
+        return timezone.now() >= self.expires_at
+    
+    @classmethod
+    def sweep_expired(cls, batch_size=1000):
         """
-        Returns True if the code is more than 15 minutes old
+        Delete expired codes in batches of `batch_size`, so a large backlog
+        never holds a long write lock. Returns the number deleted.
         """
-        expiry_time = self.created_at + timedelta(minutes=15)
-        return timezone.now() > expiry_time
+        deleted = 0
+        while True:
+            batch = list(cls.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += cls.objects.filter(pk__in=batch).delete()[0]
+
+class OutboxEmail(models.Model):
+    """An email waiting to be sent by the outbox worker (see api/outbox.py)"""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Null once delivery has been given up on
+    next_attempt_at = models.DateTimeField(null=True, default=timezone.now, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)}"
+
+class RateLimitBucket(models.Model):
+    """GCRA state for one rate-limited key (see api/ratelimit.py)"""
+    key = models.CharField(max_length=255, primary_key=True)
+    # Theoretical arrival time, as a Unix timestamp
+    tat = models.FloatField()
+
+    def __str__(self):
+        return self.key
+
+class CatalogVersion(models.Model):
+    """Version of the catalog or of one university (see api/catalog_changes.py)"""
+    # 'catalog' or 'university:<id>'
+    scope = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+class CatalogChange(models.Model):
+    """
+    Latest change to one university or course, kept as a tombstone once the
+    row is deleted (see api/catalog_changes.py)
+    """
+    # 'university' or 'course'
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    university_id = models.BigIntegerField()
+    version = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'], name='unique_catalog_change_row'),
+        ]
+        indexes = [models.Index(fields=['version'])]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} v{self.version}{' (deleted)' if self.deleted else ''}"
+
+class CatalogQuerySet(models.QuerySet):
+    """
+    Reports bulk writes, which send no per-row signals, to
+    api/catalog_changes.py as one catalog version per call.
+    """
+    # The field holding each row's university id
+    university_field = None
+
+    def _track(self, objs):
+        for obj in objs:
+            catalog_changes.track(self.model, obj.pk, getattr(obj, self.university_field))
+
+    def update(self, **kwargs):
+        # auto_now is only applied by save()
+        kwargs.setdefault('updated_at', timezone.now())
+        with catalog_changes.batch():
+            rows = list(self.values_list('pk', self.university_field))
+            updated = super().update(**kwargs)
+            moved_to = kwargs.get('university', kwargs.get('university_id'))
+            moved_to = getattr(moved_to, 'pk', moved_to)
+            for pk, university_id in rows:
+                if moved_to is None:
+                    catalog_changes.track(self.model, pk, university_id)
+                else:
+                    catalog_changes.track(self.model, pk, moved_to, previous_university_id=university_id)
+        return updated
+
+    def delete(self):
+        # Rows are reported by the post_delete signals, collected here
+        with catalog_changes.batch():
+            return super().delete()
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with catalog_changes.batch():
+            created = super().bulk_create(objs, *args, **kwargs)
+            self._track(created)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        with catalog_changes.batch():
+            updated = super().bulk_update(objs, [*fields, 'updated_at'], *args, **kwargs)
+            self._track(objs)
+        return updated
+
+class UniversityQuerySet(CatalogQuerySet):
+    university_field = 'id'
+
+class CourseQuerySet(CatalogQuerySet):
+    university_field = 'university_id'
 
 class University(models.Model):
     name = models.CharField(max_length=200)
@@ -78,10 +277,18 @@ class University(models.Model):
     ranking = models.IntegerField(null=True, blank=True)
     website = models.URLField()
     image = models.CharField(max_length=255, null=True, blank=True)  # URL to image
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UniversityQuerySet.as_manager()
     
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        # One catalog version for the university and its cascaded courses
+        with catalog_changes.batch():
+            return super().delete(*args, **kwargs)
+
 class Course(models.Model):
     university = models.ForeignKey(University, on_delete=models.CASCADE, related_name='courses')
     name = models.CharField(max_length=200)
@@ -89,10 +296,20 @@ class Course(models.Model):
     duration = models.CharField(max_length=50)  # e.g., "3 years", "4 semesters"
     fees = models.DecimalField(max_digits=10, decimal_places=2)
     level = models.CharField(max_length=50)  # e.g., "Undergraduate", "Postgraduate"
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CourseQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.name} at {self.university.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # A save that moves the course also changes the university it left
+        instance._loaded_university_id = instance.__dict__.get('university_id')
+        return instance
+
 class UserSavedCourse(models.Model):
     user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='saved_courses')
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
@@ -130,12 +347,60 @@ class Notification(models.Model):
     sender = models.ForeignKey('CustomUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='sent_notifications')
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped when further events are coalesced into this notification
+    updated_at = models.DateTimeField(default=timezone.now)
+    # Number of events this notification stands for (> 1 for rolling aggregates)
+    count = models.PositiveIntegerField(default=1)
     is_read = models.BooleanField(default=False)
     # Optionally, type: 'user', 'admin', etc.
     type = models.CharField(max_length=20, default='user')
 
+    class Meta:
+        indexes = [models.Index(fields=['recipient', 'type', 'is_read', 'updated_at'])]
+
     def __str__(self):
         return f"Notification to {self.recipient.username}: {self.message[:30]}"
+
+class PendingDigestItem(models.Model):
+    """Events held back for a digest-subscribed user until the next digest run"""
+    recipient = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='pending_digest_items')
+    type = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['recipient', 'type']
+
+    def __str__(self):
+        return f"{self.count} pending {self.type} for {self.recipient.username}"
+
+# Announcements are stored once and merged into each recipient's notification
+# feed at read time, so sending costs one INSERT regardless of audience size.
+class Announcement(models.Model):
+    AUDIENCE_CHOICES = [('all', 'Everyone')] + CustomUser.ROLE_CHOICES
+
+    sender = models.ForeignKey('CustomUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='sent_announcements')
+    message = models.TextField()
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES, default='all')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['audience', 'created_at'])]
+
+    def __str__(self):
+        return f"Announcement to {self.audience}: {self.message[:30]}"
+
+class AnnouncementRead(models.Model):
+    """Per-user read marker for an announcement"""
+    user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='announcement_reads')
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, related_name='reads')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'announcement']
+
+    def __str__(self):
+        return f"{self.user.username} read announcement {self.announcement_id}"
         
 # Models for the AI Chat Widget
 class ChatSession(models.Model):
@@ -0,0 +1,123 @@
+"""
+Notification delivery.
+
+`notify` is the entry point for system-generated notifications. It keeps the
+number of rows (and queries) per event independent of how many recipients
+there are:
+
+* Coalescable types (see COALESCE_MESSAGES) that arrive for a recipient who
+  still has an unread notification of the same type from within
+  NOTIFICATION_COALESCE_WINDOW are folded into that row, which becomes a
+  rolling aggregate such as "37 new feedback items".
+* Recipients who opted into digests (`CustomUser.notification_digest`) get no
+  per-event rows at all; their events are counted in PendingDigestItem and
+  turned into one notification per user by `send_digests`, which the
+  `send_notification_digests` management command runs periodically.
+
+Both merge into an existing row when there is one, so deliveries lock the
+recipients they may merge for (in user id order, so they cannot deadlock):
+two concurrent events for one recipient then take turns, and the second
+sees the row the first created instead of creating another.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value, CharField
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from .models import CustomUser, Notification, PendingDigestItem
+from .session import invalidate_session
+
+# Aggregate message per coalescable type; the rolling count is prepended
+COALESCE_MESSAGES = {
+    'feedback': 'new feedback items',
+    'feedback_response': 'of your feedback items have new responses',
+}
+
+
+def describe(type, count):
+    """Human-readable summary of `count` events of the given type"""
+    return f"{count} {COALESCE_MESSAGES.get(type, f'new {type} notifications')}"
+
+
+def notify(recipients, message, type='user', sender=None):
+    """
+    Deliver a notification to each recipient, coalescing or deferring to the
+    digest as configured.
+    """
+    recipients = list(recipients)
+    if not recipients:
+        return
+    digest_recipients = [user for user in recipients if user.notification_digest]
+    direct_recipients = [user for user in recipients if not user.notification_digest]
+    merging = digest_recipients + (direct_recipients if type in COALESCE_MESSAGES else [])
+    with transaction.atomic():
+        if merging:
+            list(CustomUser.objects.select_for_update().filter(pk__in=[user.pk for user in merging])
+                 .order_by('pk').values_list('pk', flat=True))
+        now = timezone.now()
+        if digest_recipients:
+            _add_to_digest(digest_recipients, type, now)
+        if direct_recipients:
+            _deliver(direct_recipients, message, type, sender, now)
+
+
+def _deliver(recipients, message, type, sender, now):
+    coalesced = set()
+    suffix = COALESCE_MESSAGES.get(type)
+    if suffix:
+        window = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', timedelta(minutes=30))
+        open_rows = Notification.objects.filter(
+            recipient__in=recipients, type=type, is_read=False, updated_at__gte=now - window
+        )
+        coalesced = set(open_rows.values_list('recipient_id', flat=True))
+        if coalesced:
+            # Both expressions see the pre-update count, so the message matches the new count
+            open_rows.update(
+                count=F('count') + 1,
+                message=Concat(Cast(F('count') + 1, output_field=CharField()), Value(f' {suffix}')),
+                sender=sender,
+                updated_at=now
+            )
+    Notification.objects.bulk_create([
+        Notification(recipient=user, sender=sender, message=message, type=type, updated_at=now)
+        for user in recipients if user.id not in coalesced
+    ])
+    # Bulk writes skip model signals
+    invalidate_session(*[user.id for user in recipients])
+
+
+def _add_to_digest(recipients, type, now):
+    pending = PendingDigestItem.objects.filter(recipient__in=recipients, type=type)
+    existing = set(pending.values_list('recipient_id', flat=True))
+    if existing:
+        pending.update(count=F('count') + 1, updated_at=now)
+    PendingDigestItem.objects.bulk_create([
+        PendingDigestItem(recipient=user, type=type, updated_at=now)
+        for user in recipients if user.id not in existing
+    ])
+
+
+def send_digests():
+    """
+    Replace every user's pending digest items with a single digest notification.
+    Returns the number of digests sent.
+    """
+    with transaction.atomic():
+        items = list(PendingDigestItem.objects.select_for_update().order_by('recipient_id', 'type'))
+        digests = []
+        for recipient_id, group in groupby(items, key=lambda item: item.recipient_id):
+            group = list(group)
+            digests.append(Notification(
+                recipient_id=recipient_id,
+                message='Your digest: ' + ', '.join(describe(item.type, item.count) for item in group),
+                type='digest',
+                count=sum(item.count for item in group)
+            ))
+        Notification.objects.bulk_create(digests)
+        PendingDigestItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+    invalidate_session(*[digest.recipient_id for digest in digests])
+    return len(digests)
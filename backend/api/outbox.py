@@ -0,0 +1,101 @@
+"""
+Transactional email outbox.
+
+Views call `enqueue` instead of sending mail themselves. That is a single
+INSERT, so it can share a transaction with the data the email is about (a
+message is queued only if that data is committed) and the response does not
+wait on SMTP. `drain`, run by the `send_queued_email` management command,
+sends due messages in batches over one SMTP connection per batch, deleting
+each one once sent. Failed messages are retried with exponential backoff up
+to OUTBOX_MAX_ATTEMPTS times, after which they are kept with
+next_attempt_at unset for inspection.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger('django')
+
+# How long a claimed batch is hidden from other workers
+LEASE = timedelta(minutes=5)
+
+
+def enqueue(subject, body, to, from_email=None):
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to)
+    )
+
+
+def backoff(attempts):
+    """Delay before retrying a message that has failed `attempts` times"""
+    base = getattr(settings, 'OUTBOX_RETRY_BACKOFF', timedelta(seconds=30))
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'OUTBOX_MAX_BACKOFF', timedelta(hours=1)))
+
+
+def _claim(batch_size, now):
+    with transaction.atomic():
+        due = OutboxEmail.objects.filter(next_attempt_at__lte=now).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        emails = list(due[:batch_size])
+        # Push the batch out of reach of other workers even after the lock is released
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(next_attempt_at=now + LEASE)
+    return emails
+
+
+def _failed(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8):
+        email.next_attempt_at = None
+        logger.error("Giving up on outbox email %s after %s attempts: %s", email.pk, email.attempts, error)
+    else:
+        email.next_attempt_at = now + backoff(email.attempts)
+        logger.warning("Outbox email %s failed (attempt %s): %s", email.pk, email.attempts, error)
+    email.save(update_fields=['attempts', 'last_error', 'next_attempt_at'])
+
+
+def drain(batch_size=None):
+    """
+    Send every due message, one batch and SMTP connection at a time.
+    Returns (sent, failed) counts.
+    """
+    batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 50)
+    sent = failed = 0
+    while True:
+        now = timezone.now()
+        emails = _claim(batch_size, now)
+        if not emails:
+            return sent, failed
+        smtp = get_connection()
+        try:
+            smtp.open()
+        except Exception as e:
+            for email in emails:
+                _failed(email, e, now)
+            # The server is unreachable; leave the rest for the next run
+            return sent, failed + len(emails)
+        try:
+            delivered = []
+            for email in emails:
+                try:
+                    EmailMessage(email.subject, email.body, email.from_email, email.to, connection=smtp).send()
+                    delivered.append(email.pk)
+                except Exception as e:
+                    _failed(email, e, now)
+                    failed += 1
+            OutboxEmail.objects.filter(pk__in=delivered).delete()
+            sent += len(delivered)
+        finally:
+            smtp.close()
+        if len(emails) < batch_size:
+            return sent, failed
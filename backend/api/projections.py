@@ -0,0 +1,271 @@
+"""
+Read-only projections for the hot list endpoints.
+
+A projection produces exactly what the matching serializer's `.data` would,
+but from `.values_list()` rows: no model instances are built and no
+serializer field machinery runs per row. Columns that serialize as-is (ids,
+strings, booleans, foreign key ids) are copied straight into the response
+dict; only Decimals and datetimes go through a converter, which mirrors
+DRF's DecimalField and DateTimeField output.
+
+Nested lists (a university's courses, a feedback's responses) are fetched
+with one extra query for the whole page, grouped by parent id.
+
+Clients can narrow a response with ?fields= and ?expand= (see
+`Projection.for_request`): only the requested columns are selected, and
+nested objects are only queried when asked for.
+
+Projections are for reading only. Views still use the serializers to
+validate and save.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.settings import api_settings
+
+from .models import Course, Feedback, FeedbackResponse, Notification, University, UserSavedCourse
+
+
+def decimal_field(decimal_places):
+    """Converter factory matching DRF's DecimalField output"""
+    exponent = Decimal('.1') ** decimal_places
+
+    def converter():
+        if api_settings.COERCE_DECIMAL_TO_STRING:
+            return lambda value: f'{value.quantize(exponent):f}'
+        return lambda value: value.quantize(exponent)
+    return converter
+
+
+def datetime_field():
+    """Converter factory matching DRF's ISO 8601 DateTimeField output"""
+    # Looked up once per list: get_current_timezone() is slow per row
+    field_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def convert(value):
+        if field_timezone is not None:
+            value = value.astimezone(field_timezone)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+class Projection:
+    """
+    `fields` is a sequence of (key, lookup) pairs, in the serializer's field
+    order; `lookup` is anything `.values_list()` accepts, such as
+    'university__name'. `converters` maps keys to converter factories, such
+    as `datetime_field`, called once per list; the converters they return
+    are applied to non-null values. `nested` maps keys to (projection class,
+    parent lookup) for reverse relations, and `related` maps keys to
+    (projection class, foreign key lookup) for objects nested through a
+    forward relation.
+    """
+    fields = ()
+    converters = {}
+    nested = {}
+    related = {}
+
+    def __init__(self, fields=None, expand=None):
+        """
+        With neither argument the output is the serializer's. Otherwise
+        `fields` (default: all) limits the output to the given keys, where a
+        dotted key such as 'courses.name' picks a field of a nested object,
+        and nested objects are only included when named in `fields` or
+        `expand`. Unknown names raise ValueError.
+        """
+        lookups = dict(self.fields)
+        relations = {**self.nested, **self.related}
+        if fields is None and expand is None:
+            selected, children = set(lookups), dict.fromkeys(relations)
+        else:
+            selected = set(lookups) if fields is None else set()
+            children = {}
+            for name in expand or ():
+                if name not in relations:
+                    raise ValueError(f"Cannot expand '{name}'")
+                children[name] = None
+            for name in fields or ():
+                key, _, subfield = name.partition('.')
+                if key in relations:
+                    if not subfield:
+                        children[key] = None
+                    elif children.get(key, ()) is not None:
+                        children[key] = [*children.get(key, ()), subfield]
+                elif key in lookups and not subfield:
+                    selected.add(key)
+                else:
+                    raise ValueError(f"Unknown field '{name}'")
+
+        self.keys = [key for key in lookups if key in selected]
+        # Columns only fetched to attach nested objects, left out of the output
+        self.hidden = []
+        if any(key in self.nested for key in children) and 'id' not in selected:
+            self.hidden.append('id')
+        for key, (_, lookup) in self.related.items():
+            if key in children and lookup not in selected and lookup not in self.hidden:
+                self.hidden.append(lookup)
+        self.lookups = [lookups[key] for key in self.keys + self.hidden]
+        self.children = {
+            key: (relations[key][0](fields=children[key]), relations[key][1], key in self.nested)
+            for key in relations if key in children
+        }
+
+    @classmethod
+    def for_request(cls, request):
+        """Projection for the request's ?fields= and ?expand= parameters"""
+        def names(param):
+            value = request.query_params.get(param)
+            if value is None:
+                return None
+            return [name.strip() for name in value.split(',') if name.strip()]
+        return cls(fields=names('fields'), expand=names('expand'))
+
+    def rows(self, queryset):
+        """Raw rows as dicts of unconverted values"""
+        keys = self.keys + self.hidden
+        return [dict(zip(keys, values)) for values in queryset.values_list(*self.lookups)]
+
+    def rows_by(self, queryset, lookup):
+        """Represented rows, each paired with its value of `lookup`"""
+        keys = self.keys + self.hidden
+        pairs = [(first, dict(zip(keys, values))) for first, *values in queryset.values_list(lookup, *self.lookups)]
+        self.represent([row for _, row in pairs])
+        return pairs
+
+    def represent(self, rows):
+        """Turn rows returned by `rows` into response dicts, in place"""
+        for key, factory in self.converters.items():
+            if key not in self.keys:
+                continue
+            converter = factory()
+            for row in rows:
+                value = row[key]
+                if value is not None:
+                    row[key] = converter(value)
+
+        for key, (projection, lookup, reverse) in self.children.items():
+            if reverse:
+                children = defaultdict(list)
+                parent_ids = [row['id'] for row in rows]
+                if parent_ids:
+                    queryset = projection.queryset().filter(**{f'{lookup}__in': parent_ids})
+                    for parent_id, child in projection.rows_by(queryset, lookup):
+                        children[parent_id].append(child)
+                for row in rows:
+                    row[key] = children.get(row['id'], [])
+            else:
+                related = {}
+                related_ids = {row[lookup] for row in rows}
+                if related_ids:
+                    related = dict(projection.rows_by(projection.queryset().filter(pk__in=related_ids), 'pk'))
+                for row in rows:
+                    row[key] = related[row[lookup]]
+
+        for key in self.hidden:
+            for row in rows:
+                del row[key]
+        return rows
+
+    def data(self, queryset):
+        return self.represent(self.rows(queryset))
+
+    def queryset(self):
+        return self.model._default_manager.all()
+
+
+class CourseProjection(Projection):
+    """Same output as CourseSerializer"""
+    model = Course
+    fields = (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('description', 'description'),
+        ('duration', 'duration'),
+        ('fees', 'fees'),
+        ('level', 'level'),
+        ('university', 'university'),
+        ('university_name', 'university__name'),
+    )
+    converters = {'fees': decimal_field(Course._meta.get_field('fees').decimal_places)}
+
+
+class UniversityProjection(Projection):
+    """Same output as UniversitySerializer"""
+    model = University
+    fields = (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('description', 'description'),
+        ('location', 'location'),
+        ('ranking', 'ranking'),
+        ('website', 'website'),
+        ('image', 'image'),
+    )
+    nested = {'courses': (CourseProjection, 'university')}
+
+
+class UserSavedCourseProjection(Projection):
+    """Same output as UserSavedCourseSerializer"""
+    model = UserSavedCourse
+    fields = (
+        ('id', 'id'),
+        ('course', 'course'),
+        ('saved_at', 'saved_at'),
+    )
+    converters = {'saved_at': datetime_field}
+    related = {'course_details': (CourseProjection, 'course')}
+
+
+class FeedbackResponseProjection(Projection):
+    """Same output as FeedbackResponseSerializer"""
+    model = FeedbackResponse
+    fields = (
+        ('id', 'id'),
+        ('feedback', 'feedback'),
+        ('admin', 'admin'),
+        ('admin_username', 'admin__username'),
+        ('message', 'message'),
+        ('created_at', 'created_at'),
+    )
+    converters = {'created_at': datetime_field}
+
+
+class FeedbackProjection(Projection):
+    """Same output as FeedbackSerializer"""
+    model = Feedback
+    fields = (
+        ('id', 'id'),
+        ('user', 'user'),
+        ('username', 'user__username'),
+        ('user_email', 'user__email'),
+        ('subject', 'subject'),
+        ('message', 'message'),
+        ('created_at', 'created_at'),
+        ('is_resolved', 'is_resolved'),
+    )
+    converters = {'created_at': datetime_field}
+    nested = {'responses': (FeedbackResponseProjection, 'feedback')}
+
+
+class NotificationProjection(Projection):
+    """Same output as NotificationSerializer"""
+    model = Notification
+    fields = (
+        ('id', 'id'),
+        ('recipient', 'recipient'),
+        ('recipient_username', 'recipient__username'),
+        ('sender', 'sender'),
+        ('sender_username', 'sender__username'),
+        ('message', 'message'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+        ('count', 'count'),
+        ('is_read', 'is_read'),
+        ('type', 'type'),
+    )
+    converters = {'created_at': datetime_field, 'updated_at': datetime_field}
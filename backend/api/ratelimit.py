@@ -0,0 +1,171 @@
+"""
+Rate limiting with GCRA (generic cell rate algorithm).
+
+Each key stores a single number, its theoretical arrival time (TAT), so the
+memory per key is constant however many requests it sees. A policy of
+"N/period" spaces requests period/N apart and allows bursts of up to N.
+
+Two stores are available, selected with the RATELIMIT_STORE setting:
+
+* 'database' (default) keeps buckets in RateLimitBucket and updates them with
+  a single conditional UPDATE, so limits are exact and shared by every worker
+  using the same database, and survive restarts.
+* 'cache' keeps buckets in the Django cache named by RATELIMIT_CACHE. It is
+  shared when that cache is (Redis, Memcached, file-based), but
+  read-modify-write, so concurrent requests can slightly overshoot a limit.
+
+Views opt in with the GCRAThrottle subclasses below, whose policies come from
+the RATELIMIT_POLICIES setting. DRF turns a rejection into a 429 response
+carrying a Retry-After header.
+"""
+import hashlib
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Greatest
+from rest_framework.throttling import BaseThrottle
+
+from .models import RateLimitBucket
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Fraction of database hits that also purge drained buckets
+PURGE_PROBABILITY = 0.001
+
+
+def parse_policy(policy):
+    """
+    Turn 'N/period' (period: second, minute, hour or day) into
+    (emission interval, burst tolerance) in seconds.
+    """
+    num, period = policy.split('/')
+    num = int(num)
+    interval = PERIODS[period[0]] / num
+    return interval, interval * num
+
+
+class DatabaseStore:
+    def hit(self, key, interval, tolerance):
+        for _ in range(2):
+            now = time.time()
+            # Allowed iff max(tat, now) + interval <= now + tolerance, i.e. tat <= now + tolerance - interval
+            updated = RateLimitBucket.objects.filter(key=key, tat__lte=now + tolerance - interval).update(
+                tat=Greatest(F('tat'), Value(now, output_field=FloatField())) + interval
+            )
+            if updated:
+                self._maybe_purge(now)
+                return True, 0
+            bucket, created = RateLimitBucket.objects.get_or_create(key=key, defaults={'tat': now + interval})
+            if created:
+                return True, 0
+            wait = bucket.tat - (now + tolerance - interval)
+            if wait > 0:
+                return False, wait
+            # The bucket drained between the two queries; try again
+        return False, interval
+
+    def _maybe_purge(self, now):
+        if random.random() < PURGE_PROBABILITY:
+            # A bucket whose TAT has passed behaves exactly like a missing one
+            RateLimitBucket.objects.filter(tat__lt=now).delete()
+
+
+class CacheStore:
+    def hit(self, key, interval, tolerance):
+        cache = caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+        now = time.time()
+        cache_key = f'ratelimit:{key}'
+        tat = max(cache.get(cache_key, now), now)
+        if tat - now > tolerance - interval:
+            return False, tat - (now + tolerance - interval)
+        # Expire the entry once it has fully drained
+        cache.set(cache_key, tat + interval, timeout=int(tat + interval - now) + 1)
+        return True, 0
+
+
+STORES = {
+    'database': DatabaseStore,
+    'cache': CacheStore,
+}
+
+
+def hit(key, policy):
+    """
+    Count one request against `key` under `policy` ('N/period').
+    Returns (allowed, seconds to wait before retrying).
+    """
+    interval, tolerance = parse_policy(policy)
+    store = STORES[getattr(settings, 'RATELIMIT_STORE', 'database')]()
+    return store.hit(key, interval, tolerance)
+
+
+class GCRAThrottle(BaseThrottle):
+    """
+    DRF throttle backed by `hit`. Subclasses set `scope`, which names their
+    policy in RATELIMIT_POLICIES, and may override `get_ident_key`.
+    """
+    scope = None
+
+    def get_ident_key(self, request):
+        """Identify the client: the user id if authenticated, else the IP"""
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        policy = getattr(settings, 'RATELIMIT_POLICIES', {}).get(self.scope)
+        ident = self.get_ident_key(request) if policy else None
+        if ident is None:
+            return True
+        allowed, self.retry_after = hit(f'{self.scope}:{ident}', policy)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonIPThrottle(GCRAThrottle):
+    """Limits by client IP, whether or not the request is authenticated"""
+
+    def get_ident_key(self, request):
+        return f'ip:{self.get_ident(request)}'
+
+
+class LoginThrottle(AnonIPThrottle):
+    scope = 'login'
+
+
+class LoginAccountThrottle(GCRAThrottle):
+    """
+    Limits attempts against one account from any number of IPs. The key is a
+    hash of the submitted username or email, so none are stored in clear.
+    """
+    scope = 'login_account'
+    fields = ('username', 'email')
+
+    def get_ident_key(self, request):
+        login_id = next((request.data.get(name) for name in self.fields if request.data.get(name)), None)
+        if not isinstance(login_id, str):
+            return None
+        return hashlib.sha256(login_id.strip().lower().encode()).hexdigest()
+
+
+class PasswordResetThrottle(AnonIPThrottle):
+    scope = 'password_reset'
+
+
+class PasswordResetAccountThrottle(LoginAccountThrottle):
+    scope = 'password_reset_account'
+    fields = ('email',)
+
+
+class PasswordResetVerifyThrottle(AnonIPThrottle):
+    scope = 'password_reset_verify'
+
+
+class PasswordResetVerifyAccountThrottle(PasswordResetAccountThrottle):
+    """Bounds guesses at one account's reset code, whatever IPs they come from"""
+    scope = 'password_reset_verify_account'
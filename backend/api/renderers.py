@@ -0,0 +1,131 @@
+"""
+Renderers and parsers for the API.
+
+FastJSONRenderer and FastJSONParser are backed by orjson and produce and
+accept exactly what DRF's JSONRenderer and JSONParser do: datetimes,
+Decimals, lazy translation strings and the other types DRF's encoder knows
+are handed to that encoder, and U+2028/U+2029 are escaped the same way.
+Whenever orjson is not installed, or a request needs something orjson cannot
+do (indented output, ASCII-only output, a non-UTF-8 body), they defer to the
+stock DRF classes.
+
+The MessagePack and CBOR classes let clients ask for a binary encoding of
+the same data through Accept and send one through Content-Type. Datetimes
+are encoded natively (msgpack timestamp extension, CBOR epoch tag) rather
+than as strings; Decimals become floats in MessagePack, as in JSON, and exact
+decimal fractions in CBOR. They are only enabled in settings when the
+`msgpack` or `cbor2` package is installed.
+"""
+import codecs
+import datetime
+import decimal
+
+from django.conf import settings
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Datetimes go to DRF's encoder too, which trims microseconds to milliseconds
+        ret = orjson.dumps(
+            data, default=_encoder.default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(parsers.JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, datetime.datetime) and obj.tzinfo is not None:
+        return msgpack.Timestamp.from_datetime(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    return _encoder.default(obj)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+class MessagePackParser(parsers.BaseParser):
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            # timestamp=3 turns timestamps back into aware datetimes
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except Exception as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+def _cbor_default(encoder, obj):
+    encoder.encode(_encoder.default(obj))
+
+
+class CBORRenderer(renderers.BaseRenderer):
+    media_type = 'application/cbor'
+    format = 'cbor'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return cbor2.dumps(data, datetime_as_timestamp=True, default=_cbor_default)
+
+
+class CBORParser(parsers.BaseParser):
+    media_type = 'application/cbor'
+    renderer_class = CBORRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except Exception as exc:
+            raise ParseError('CBOR parse error - %s' % str(exc))
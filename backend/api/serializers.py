@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Submission, UserProfile, University, Course, UserSavedCourse, Feedback, FeedbackResponse, Notification, CustomUser
+from .models import Submission, UserProfile, University, Course, UserSavedCourse, Feedback, FeedbackResponse, Notification, CustomUser, Announcement
+from .images import DEFAULT_AVATAR_SIZE, avatar_name, avatar_storage, pick_size
 
 class SubmissionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,19 +22,25 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
     
     def get_profile_picture(self, obj):
+        """
+        URL of the processed variant closest to the `avatar_size` context
+        value (in pixels), falling back to the original upload for pictures
+        uploaded before processing was added.
+        """
         if hasattr(obj, 'profile') and obj.profile:
-            # Check both profile_picture and image fields (for backward compatibility)
+            if obj.profile.avatar_hash:
+                size = pick_size(self.context.get('avatar_size', DEFAULT_AVATAR_SIZE))
+                return avatar_storage.url(avatar_name(obj.profile.avatar_hash, size))
             if obj.profile.profile_picture:
                 return obj.profile.profile_picture.url
-            elif obj.profile.image:
-                return obj.profile.image.url
         return None
     
     def get_bio(self, obj):
-        # Always get or create the profile to ensure bio is present
-        from .models import UserProfile
-        profile, created = UserProfile.objects.get_or_create(user=obj)
-        return profile.bio
+        # Users without a profile row have no bio; don't create one on read
+        try:
+            return obj.profile.bio
+        except UserProfile.DoesNotExist:
+            return None
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -70,7 +77,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         # Basic email format validation
         if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', value):
             raise serializers.ValidationError("Please enter a valid email address.")
-        if CustomUser.objects.filter(email=value).exists():
+        if CustomUser.objects.filter(email__iexact=value).exists():
             raise serializers.ValidationError("This email is already registered.")
         return value.lower()
     
@@ -206,4 +213,50 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ['id', 'recipient', 'recipient_username', 'sender', 'sender_username', 'message', 'created_at', 'is_read', 'type']
\ No newline at end of file
+        fields = ['id', 'recipient', 'recipient_username', 'sender', 'sender_username', 'message', 'created_at', 'updated_at', 'count', 'is_read', 'type']
+        read_only_fields = ['updated_at', 'count']
+
+
+class AnnouncementSerializer(serializers.ModelSerializer):
+    sender_username = serializers.CharField(source='sender.username', read_only=True, default=None)
+
+    class Meta:
+        model = Announcement
+        fields = ['id', 'sender', 'sender_username', 'message', 'audience', 'created_at']
+        read_only_fields = ['sender']
+
+
+class AnnouncementNotificationSerializer(serializers.ModelSerializer):
+    """
+    Renders an announcement in the same shape as NotificationSerializer so it
+    can be merged into a user's notification feed. Expects the queryset to be
+    annotated with `is_read` and the request in the serializer context.
+    """
+    id = serializers.SerializerMethodField()
+    recipient = serializers.SerializerMethodField()
+    recipient_username = serializers.SerializerMethodField()
+    sender_username = serializers.CharField(source='sender.username', read_only=True, default=None)
+    updated_at = serializers.DateTimeField(source='created_at', read_only=True)
+    count = serializers.SerializerMethodField()
+    is_read = serializers.BooleanField(read_only=True)
+    type = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Announcement
+        fields = ['id', 'recipient', 'recipient_username', 'sender', 'sender_username', 'message', 'created_at', 'updated_at', 'count', 'is_read', 'type']
+
+    def get_id(self, obj):
+        # Prefixed so it never collides with Notification ids in the merged feed
+        return f"announcement-{obj.id}"
+
+    def get_recipient(self, obj):
+        return self.context['request'].user.id
+
+    def get_recipient_username(self, obj):
+        return self.context['request'].user.username
+
+    def get_count(self, obj):
+        return 1
+
+    def get_type(self, obj):
+        return 'announcement'
@@ -0,0 +1,94 @@
+"""
+Cached session data shared by the identity endpoints.
+
+`get_session` returns the data the frontend needs to bootstrap a session
+(identity, role, profile picture, unread notification count and saved course
+ids). It is cached per user under a version stamp that signals and the bulk
+notification paths replace whenever any of that data changes. Announcements
+are tracked with one global stamp, so sending one stays O(1). The stamps
+live in the shared cache, so a change made by any process (another worker,
+the digest cron job) reaches every process. They also form the ETag, so a
+repeat verification can be answered with a 304 after one stamp lookup.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import Exists, OuterRef
+from rest_framework import status
+from rest_framework.response import Response
+
+ANNOUNCEMENTS_STAMP_KEY = 'session_announcements_version'
+
+
+def _stamp_key(user_id):
+    return f'session_version:{user_id}'
+
+
+def invalidate_session(*user_ids):
+    caches['shared'].set_many({_stamp_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+def invalidate_all_sessions():
+    """Used when an announcement is sent or removed"""
+    caches['shared'].set(ANNOUNCEMENTS_STAMP_KEY, uuid.uuid4().hex, None)
+
+
+def session_etag(user_id):
+    shared = caches['shared']
+    keys = [_stamp_key(user_id), ANNOUNCEMENTS_STAMP_KEY]
+    stamps = shared.get_many(keys)
+    if len(stamps) < len(keys):
+        # First use, or evicted; add() so racing processes agree
+        for key in keys:
+            shared.add(key, uuid.uuid4().hex, None)
+        stamps = shared.get_many(keys)
+    return f'"{user_id}-{stamps[keys[0]]}-{stamps[keys[1]]}"'
+
+
+def _build_session(user):
+    from .models import Announcement, AnnouncementRead, Notification, UserSavedCourse
+    from .serializers import UserSerializer
+
+    unread_announcements = Announcement.objects.filter(
+        audience__in=['all', user.role],
+        created_at__gte=user.date_joined
+    ).exclude(
+        Exists(AnnouncementRead.objects.filter(user=user, announcement=OuterRef('pk')))
+    ).count()
+    return {
+        'user': UserSerializer(user).data,
+        'is_superuser': user.is_superuser,
+        'is_staff': user.is_staff,
+        'unread_notifications': Notification.objects.filter(recipient=user, is_read=False).count() + unread_announcements,
+        'saved_course_ids': list(UserSavedCourse.objects.filter(user=user).values_list('course_id', flat=True)),
+    }
+
+
+def get_session(user, etag=None):
+    """Return (etag, session data) for the user, building the data on a cache miss"""
+    etag = etag or session_etag(user.pk)
+    key = f'session:{etag}'
+    data = cache.get(key)
+    if data is None:
+        data = _build_session(user)
+        cache.set(key, data, getattr(settings, 'SESSION_DATA_CACHE_TTL', 300))
+    return etag, data
+
+
+def session_response(request, render, variant):
+    """
+    Respond with render(session data) for the authenticated user, or with a
+    304 if the client's If-None-Match still matches. `variant` tells apart
+    endpoints that render the same session data differently.
+    """
+    session = session_etag(request.user.pk)
+    etag = session[:-1] + f'-{variant}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(render(get_session(request.user, session)[1]))
+    response['ETag'] = etag
+    # Let browsers keep the body but revalidate on every use
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    TokenClaimsUser, UserProfile, UserSavedCourse, Notification, Announcement, AnnouncementRead,
+    University, Course, Feedback, FeedbackResponse,
+)
+from . import catalog, catalog_changes, snapshots
+from .images import release_avatar
+from .session import invalidate_session, invalidate_all_sessions
+from .user_cache import invalidate_user
+
+
+# Saves through the TokenClaimsUser proxy are sent with the proxy as sender
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_save, sender=TokenClaimsUser)
+@receiver(post_delete, sender=TokenClaimsUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the cached auth user whenever the row changes (role, password, deletion, ...)"""
+    invalidate_user(instance.pk)
+    invalidate_session(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=UserSavedCourse)
+@receiver(post_delete, sender=UserSavedCourse)
+@receiver(post_save, sender=AnnouncementRead)
+def invalidate_user_session(sender, instance, **kwargs):
+    invalidate_session(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_recipient_session(sender, instance, **kwargs):
+    invalidate_session(instance.recipient_id)
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def invalidate_announcement_sessions(sender, instance, **kwargs):
+    invalidate_all_sessions()
+
+
+@receiver(post_delete, sender=UserProfile)
+def release_profile_avatar(sender, instance, **kwargs):
+    if instance.avatar_hash:
+        release_avatar(instance.avatar_hash)
+
+
+@receiver(post_save, sender=University)
+@receiver(post_delete, sender=University)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def track_catalog_change(sender, instance, signal, **kwargs):
+    if isinstance(instance, University):
+        catalog_changes.track(sender, instance.pk, instance.pk, deleted=signal is post_delete)
+    else:
+        catalog_changes.track(
+            sender, instance.pk, instance.university_id, deleted=signal is post_delete,
+            previous_university_id=getattr(instance, '_loaded_university_id', None),
+        )
+        instance._loaded_university_id = instance.university_id
+
+
+@receiver(catalog_changes.catalog_changed)
+def invalidate_catalog(sender, universities, **kwargs):
+    # Only once committed, so no process can cache the old rows under the new tag stamps
+    tags = [catalog_changes.university_scope(pk) for pk in universities]
+    transaction.on_commit(lambda: catalog.invalidate('catalog', *tags))
+
+
+@receiver(catalog_changes.catalog_changed)
+def rebuild_catalog_snapshot(sender, **kwargs):
+    if settings.CATALOG_SNAPSHOT_AUTO_BUILD:
+        transaction.on_commit(snapshots.builder.request)
+
+
+@receiver(post_save, sender=Feedback)
+@receiver(post_delete, sender=Feedback)
+@receiver(post_save, sender=FeedbackResponse)
+@receiver(post_delete, sender=FeedbackResponse)
+def invalidate_feedback(sender, instance, **kwargs):
+    transaction.on_commit(lambda: catalog.invalidate('feedback'))
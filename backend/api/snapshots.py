@@ -0,0 +1,175 @@
+"""
+Prebuilt snapshots of the whole catalog for clients loading it cold.
+
+`build()` renders every university and course, in the shape of a full sync
+from /api/catalog/changes/ (so the snapshot's `version` is where a client
+continues with deltas), as JSON and, when msgpack is installed, MessagePack.
+Each encoding is written under MEDIA_ROOT/catalog/ as
+<content hash>_<version>.<ext>, next to a copy per available compression
+codec at its highest level (.br, .zst, .gz). The names match the immutable
+pattern in api/views_media.py, which serves them with year-long cache
+headers and picks the precompressed copy the client accepts, so a cold
+load is a static file read. The manifest naming the current files is
+written last, to catalog/manifest.json.
+
+The `catalog_changed` receiver in api/signals.py asks `builder` for a
+rebuild once the change commits. Builds run in a background thread, after
+CATALOG_SNAPSHOT_DELAY seconds so that a burst of edits is built once, and
+requests arriving during a build are folded into one more build. The
+thread dies with its process, so a short-lived script that changes the
+catalog (like loader/load_courses.py) calls `build()` itself before it
+exits, and /api/catalog/snapshot/ requests a build whenever the manifest
+is older than the catalog. The build_catalog_snapshot command builds one
+directly, e.g. after a deploy.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+
+from .catalog_changes import current_version
+from .middleware import BrotliCodec, GzipCodec, ZstdCodec, brotli, zstandard
+from .projections import CourseProjection, UniversityProjection
+from .renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+from .storage import ContentAddressedStorage
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = 'catalog'
+MANIFEST = f'{SNAPSHOT_DIR}/manifest.json'
+
+# File suffix for each Content-Encoding, also used by api/views_media.py
+ENCODING_SUFFIXES = {'br': '.br', 'zstd': '.zst', 'gzip': '.gz'}
+
+
+def storage():
+    return ContentAddressedStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+
+
+def _codecs():
+    # Built once per catalog change and read many times, so compress hard
+    codecs = [GzipCodec(level=9)]
+    if brotli is not None:
+        codecs.append(BrotliCodec(quality=11))
+    if zstandard is not None:
+        codecs.append(ZstdCodec(level=19))
+    return codecs
+
+
+def _encodings(data):
+    encodings = {'json': FastJSONRenderer().render(data)}
+    if msgpack is not None:
+        encodings['msgpack'] = MessagePackRenderer().render(data)
+    return encodings
+
+
+def render():
+    """The catalog as a full sync from /api/catalog/changes/ would return it"""
+    # Read first: rows changed after it are sent again by the next delta, never missed
+    version = current_version()
+    universities = UniversityProjection(expand=())
+    courses = CourseProjection()
+    return {
+        'version': version,
+        'more': False,
+        'universities': universities.data(universities.queryset().order_by('pk')),
+        'courses': courses.data(courses.queryset().order_by('pk')),
+        'deleted': {'universities': [], 'courses': []},
+    }
+
+
+def read_manifest():
+    """The current snapshot's manifest, or None before the first build"""
+    try:
+        with storage().open(MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build():
+    """Build a snapshot of the current catalog and make it the current one; returns its manifest"""
+    files = storage()
+    data = render()
+    encodings = _encodings(data)
+    digest = hashlib.sha256(encodings['json']).hexdigest()[:32]
+    names = {}
+    for ext, content in encodings.items():
+        name = f'{SNAPSHOT_DIR}/{digest}_{data["version"]}.{ext}'
+        if not files.exists(name):
+            for codec in _codecs():
+                files.save(name + ENCODING_SUFFIXES[codec.name], ContentFile(codec.compress(content)))
+            # Written last: the compressed copies are in place once the name exists
+            files.save(name, ContentFile(content))
+        names[ext] = name
+
+    manifest = {'version': data['version'], 'hash': digest, 'files': names, 'built_at': time.time()}
+    # Replaced atomically, like every file in this storage
+    files.save(MANIFEST, ContentFile(FastJSONRenderer().render(manifest)))
+    prune(keep=settings.CATALOG_SNAPSHOT_KEEP, current=digest)
+    return manifest
+
+
+def prune(keep, current):
+    """Delete all but the newest `keep` snapshots (always keeping `current`)"""
+    files = storage()
+    try:
+        _, names = files.listdir(SNAPSHOT_DIR)
+    except FileNotFoundError:
+        return 0
+    snapshots = {}
+    for name in names:
+        stem = name.split('.', 1)[0]
+        digest, _, version = stem.partition('_')
+        if version.isdigit():
+            snapshots.setdefault((int(version), digest), []).append(name)
+    # Snapshots being downloaded right now stay readable until `keep` newer ones exist
+    kept = sorted(snapshots, reverse=True)[:keep]
+    deleted = 0
+    for key, group in snapshots.items():
+        if key in kept or key[1] == current:
+            continue
+        for name in group:
+            files.delete(f'{SNAPSHOT_DIR}/{name}')
+            deleted += 1
+    return deleted
+
+
+class Builder:
+    """Runs builds in a background thread, folding requests made during a build into the next one"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = False
+
+    def request(self):
+        with self._lock:
+            if self._running:
+                self._pending = True
+                return
+            self._running = True
+        threading.Thread(target=self._run, name='catalog-snapshot', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.CATALOG_SNAPSHOT_DELAY)
+            try:
+                build()
+            except Exception:
+                logger.exception("Building the catalog snapshot failed")
+            finally:
+                close_old_connections()
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
+
+
+builder = Builder()
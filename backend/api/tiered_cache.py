@@ -0,0 +1,280 @@
+"""
+Two-level cache for computed objects and response data.
+
+L1 is an LRU dict in each process (TIERED_CACHE_L1_SIZE entries). L2 is the
+'shared' cache alias, which every process sees: the database cache on a
+single box, or Redis/memcached when configured in settings. An L1 entry is
+trusted for at most TIERED_CACHE_L1_TTL seconds before it is checked against
+L2 again, which bounds how long another process's invalidation can go
+unseen; invalidations in the same process apply to L1 at once.
+
+Entries carry tags such as 'catalog' or 'university:42'. Each tag has a
+random version stamp in L2, recorded in the entry when it is written;
+`invalidate()` replaces the stamps, so every entry written under the old
+ones becomes a miss.
+
+Concurrent misses for one key in a process are coalesced into a single
+computation (`SingleFlight`). Across processes, the first to miss takes a
+short lock in L2 and the others wait for its value, or compute it themselves
+once the lock is released without one (an error, or an uncacheable
+result). To keep popular keys
+from all expiring at once, a hit may also trigger a recomputation shortly
+before expiry, with a probability that rises as expiry approaches and with
+how long the value took to compute ("XFetch").
+
+Values kept in L1 are shared by all threads of the process, so callers must
+treat them as read-only, or pass private=True to get a fresh copy each time.
+"""
+import hashlib
+import math
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+# `value` is pickled for private entries; `tags` maps each tag to its stamp
+Entry = namedtuple('Entry', 'value expires delta tags private')
+
+
+class LRU:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def set(self, key, item, maxsize):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def drop_tagged(self, tags):
+        with self._lock:
+            for key in [key for key, (entry, _) in self._items.items() if not tags.isdisjoint(entry.tags)]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time; callers arriving while it runs wait for
+    its result. If the call raises, each waiting caller makes its own call.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.ok = False
+            self.result = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.done.wait()
+            return call.result if call.ok else func()
+        try:
+            call.result = func()
+            call.ok = True
+            return call.result
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class Uncacheable(Exception):
+    """Raised by a compute function to hand back `result` without caching it"""
+
+    def __init__(self, result):
+        self.result = result
+
+
+class TieredCache:
+    def __init__(self):
+        self.local = LRU()
+        self.flights = SingleFlight()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'TIERED_CACHE_L2', 'shared')]
+
+    @staticmethod
+    def _shared_key(key):
+        # Keys may hold paths and query strings, which not every backend accepts
+        return 'tiered:' + hashlib.sha1(key.encode()).hexdigest()
+
+    def tag_versions(self, tags):
+        if not tags:
+            return {}
+        keys = {f'tiered_tag:{tag}': tag for tag in tags}
+        found = self.shared.get_many(list(keys))
+        versions = {}
+        for key, tag in keys.items():
+            version = found.get(key)
+            if version is None:
+                # add() so concurrent first writers agree on one stamp
+                self.shared.add(key, uuid.uuid4().hex, None)
+                version = self.shared.get(key)
+            versions[tag] = version
+        return versions
+
+    def invalidate(self, *tags):
+        """Make every entry tagged with any of `tags` a miss"""
+        self.shared.set_many({f'tiered_tag:{tag}': uuid.uuid4().hex for tag in tags}, None)
+        self.local.drop_tagged(set(tags))
+
+    def delete(self, key):
+        self.shared.delete(self._shared_key(key))
+        self.local.delete(key)
+
+    def _lookup(self, key, local=True):
+        now = time.time()
+        if local:
+            item = self.local.get(key)
+            if item is not None:
+                entry, checked = item
+                if now - checked < settings.TIERED_CACHE_L1_TTL and now < entry.expires:
+                    return entry
+        entry = self.shared.get(self._shared_key(key))
+        if entry is None or now >= entry.expires or (entry.tags and self.tag_versions(entry.tags) != entry.tags):
+            self.local.delete(key)
+            return None
+        self.local.set(key, (entry, now), settings.TIERED_CACHE_L1_SIZE)
+        return entry
+
+    @staticmethod
+    def _expires_early(entry):
+        # XFetch: -log(u) is exponentially distributed, so recomputations are
+        # rare long before expiry and near-certain right before it
+        gap = entry.delta * settings.TIERED_CACHE_BETA * -math.log(1.0 - random.random())
+        return time.time() + gap >= entry.expires
+
+    @staticmethod
+    def _value(entry):
+        return pickle.loads(entry.value) if entry.private else entry.value
+
+    def get_or_compute(self, key, compute, ttl, tags=(), private=False):
+        """
+        Cached value for `key`, calling `compute()` to fill it on a miss. The
+        entry lives for `ttl` seconds unless one of `tags` is invalidated.
+        """
+        entry = self._lookup(key)
+        if entry is not None and not self._expires_early(entry):
+            return self._value(entry)
+        return self.flights.do(key, lambda: self._refresh(key, compute, ttl, tags, private, entry))
+
+    def _refresh(self, key, compute, ttl, tags, private, current):
+        lock_key = self._shared_key(key) + ':lock'
+        timeout = settings.TIERED_CACHE_LOCK_TIMEOUT
+        locked = self.shared.add(lock_key, 1, timeout)
+        if not locked:
+            if current is not None:
+                # Another process is already refreshing a still valid value
+                return self._value(current)
+            deadline = time.time() + timeout
+            while time.time() < deadline:
+                time.sleep(0.05)
+                entry = self._lookup(key, local=False)
+                if entry is not None:
+                    return self._value(entry)
+                if self.shared.get(lock_key) is None:
+                    # Released without a value (an error or Uncacheable); don't wait out the timeout
+                    break
+            # The other process failed, is too slow or is gone; compute it here too
+        try:
+            # Stamps are read first, so an invalidation during compute() makes this entry stale
+            versions = self.tag_versions(tags)
+            start = time.time()
+            value = compute()
+            now = time.time()
+            entry = Entry(pickle.dumps(value) if private else value, now + ttl, now - start, versions, private)
+            self.shared.set(self._shared_key(key), entry, ttl)
+            self.local.set(key, (entry, now), settings.TIERED_CACHE_L1_SIZE)
+            return value
+        finally:
+            if locked:
+                self.shared.delete(lock_key)
+
+
+tiered = TieredCache()
+
+
+def cached(ttl, tags=(), key=None, private=False):
+    """
+    Cache a function's return value for `ttl` seconds. `key` and `tags`
+    may be callables taking the function's arguments; by default the key is
+    the arguments' repr.
+    """
+    def decorator(func):
+        prefix = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else repr((args, sorted(kwargs.items())))
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            return tiered.get_or_compute(f'{prefix}:{cache_key}', lambda: func(*args, **kwargs), ttl, entry_tags, private)
+        return wrapper
+    return decorator
+
+
+def cached_response(ttl, tags=(), per_user=False, vary=None):
+    """
+    Cache the data of a function view's 200 responses to GET, keyed by path
+    and query string (and user, with per_user). Goes below @api_view;
+    `tags` may be a callable taking the view's arguments, and so must
+    `vary`, whose result is added to the key (such as the data's version).
+    """
+    def decorator(view):
+        prefix = f'{view.__module__}.{view.__qualname__}'
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            cache_key = f'{prefix}:{request.get_full_path()}'
+            if per_user:
+                cache_key += f':user={request.user.pk}'
+            if vary is not None:
+                cache_key += f':{vary(request, *args, **kwargs)}'
+            entry_tags = tags(request, *args, **kwargs) if callable(tags) else tags
+
+            def compute():
+                response = view(request, *args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    raise Uncacheable(response)
+                return response.data
+            try:
+                return Response(tiered.get_or_compute(cache_key, compute, ttl, entry_tags))
+            except Uncacheable as e:
+                return e.result
+        return wrapper
+    return decorator
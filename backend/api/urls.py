@@ -2,10 +2,12 @@ from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     hello, submissions, get_user_profile, update_user_profile,
-    promote_to_admin, list_universities, university_detail, list_courses, course_detail,
+    promote_to_admin, list_universities, university_detail, list_courses, course_detail, courses_batch,
+    catalog_version, catalog_changes_feed, catalog_snapshot,
     user_saved_courses, list_users, user_detail,
     feedback_list, feedback_detail, feedback_response_create, featured_feedback, popular_feedback,
-    notifications_list, notifications_create, notifications_mark_read, notifications_clear_all, me
+    notifications_list, notifications_create, notifications_mark_read, notifications_clear_all, me,
+    announcements_create, announcement_mark_read, notification_preferences
 )
 from .views_auth import (
     register_view, login_view, logout_view, current_user_view, 
@@ -15,9 +17,11 @@ from .views_auth import (
 from .views_search import search
 from .views_popular import popular_items
 from .views_notifications import feedback_unread, feedback_mark_read, feedback_mark_all_read
-from .views_verify import verify_auth
+from .views_verify import verify_auth, session_bootstrap
 from .views_chat import chat_message, chat_history, chat_clear, chat_summary
 from .views_password_reset import request_reset, verify_code_reset
+from .views_metrics import metrics
+from .views_batch import batch
 
 urlpatterns = [
     path('hello/', hello, name='hello'),
@@ -31,6 +35,7 @@ urlpatterns = [
     path('auth/refresh/', refresh_token_view, name='token_refresh'),
     path('auth/csrf/', get_csrf_token, name='csrf_token'),
     path('auth/verify/', verify_auth, name='verify_auth'),
+    path('auth/session/', session_bootstrap, name='session_bootstrap'),
     path('auth/upload-profile-picture/', upload_profile_picture, name='upload_profile_picture'),
     path('auth/change-password/', change_password, name='change_password'),
     path('auth/edit-username/', edit_username, name='edit_username'),
@@ -55,6 +60,10 @@ urlpatterns = [
     path('universities/<int:pk>/', university_detail, name='university_detail'),
     path('courses/', list_courses, name='courses'),
     path('courses/<int:pk>/', course_detail, name='course_detail'),
+    path('courses/batch/', courses_batch, name='courses_batch'),
+    path('catalog/version/', catalog_version, name='catalog_version'),
+    path('catalog/changes/', catalog_changes_feed, name='catalog_changes'),
+    path('catalog/snapshot/', catalog_snapshot, name='catalog_snapshot'),
     
     # User saved courses
     path('user/saved-courses/', user_saved_courses, name='user_saved_courses'),
@@ -72,6 +81,9 @@ urlpatterns = [
     path('notifications/create/', notifications_create, name='notifications_create'),
     path('notifications/<int:pk>/mark-read/', notifications_mark_read, name='notifications_mark_read'),
     path('notifications/clear-all/', notifications_clear_all, name='notifications_clear_all'),
+    path('notifications/preferences/', notification_preferences, name='notification_preferences'),
+    path('notifications/announcement-<int:pk>/mark-read/', announcement_mark_read, name='announcement_mark_read'),
+    path('announcements/', announcements_create, name='announcements_create'),
     
     # Search
     path('search/', search, name='search'),
@@ -91,4 +103,10 @@ urlpatterns = [
     # Password reset endpoints
     path('request-reset/', request_reset, name='request_reset'),
     path('verify-code-reset/', verify_code_reset, name='verify_code_reset'),
+
+    # Runtime metrics (admins only)
+    path('metrics/', metrics, name='metrics'),
+
+    # Several reads in one round trip
+    path('batch/', batch, name='batch'),
 ]
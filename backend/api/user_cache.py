@@ -0,0 +1,96 @@
+"""
+Short-TTL cache of user rows for token-authenticated requests.
+
+Entries are keyed by user id and a per-user version stamp. Saving or deleting
+a user (which covers role, password and profile field changes) replaces the
+stamp, so every entry cached under the old stamp becomes unreachable at once,
+including one written by a request that loaded the user just before the
+change. The stamps live in the shared cache, so a change made by any process
+(another worker, a management command) reaches them all; the rows themselves
+stay in each process's local cache, keyed by stamp. Hit/miss counters are
+kept per process and exposed through `stats()`.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+_stats = CacheStats()
+
+
+def get_stamp(key):
+    """
+    Current version stamp stored under `key`. Stamps are random, so an
+    evicted stamp is replaced by one that matches no existing entry.
+    """
+    shared = caches['shared']
+    stamp = shared.get(key)
+    if stamp is None:
+        # add() so concurrent first requests agree on a single stamp
+        shared.add(key, uuid.uuid4().hex, None)
+        stamp = shared.get(key)
+    return stamp
+
+
+def new_stamp(key):
+    caches['shared'].set(key, uuid.uuid4().hex, None)
+
+
+def _version_key(user_id):
+    return f'auth_user_version:{user_id}'
+
+
+def get_user(user_id):
+    """
+    Return the user with the given id, or None if there is no such user.
+    """
+    key = f'auth_user:{user_id}:{get_stamp(_version_key(user_id))}'
+    user = cache.get(key)
+    _stats.record(user is not None)
+    if user is None:
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TTL', 60))
+    return user
+
+
+def invalidate_user(user_id):
+    new_stamp(_version_key(user_id))
+
+
+def stats():
+    return _stats.as_dict()
+
+
+def reset_stats():
+    _stats.reset()
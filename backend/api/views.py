@@ -1,5 +1,7 @@
+import heapq
 from django.contrib.auth import authenticate
-from django.db.models import Q
+from django.conf import settings
+from django.db.models import Q, Exists, OuterRef
 
 # Import REST framework modules
 from rest_framework.decorators import api_view, permission_classes, parser_classes, action
@@ -7,7 +9,6 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status, generics
 from rest_framework.pagination import PageNumberPagination
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.parsers import MultiPartParser, FormParser
 
 @api_view(['POST'])
@@ -17,15 +18,35 @@ def notifications_clear_all(request):
     Mark all notifications as read for the authenticated user.
     """
     Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    unread_announcements = get_visible_announcements(request.user).filter(is_read=False).values_list('pk', flat=True)
+    AnnouncementRead.objects.bulk_create(
+        [AnnouncementRead(user=request.user, announcement_id=pk) for pk in unread_announcements],
+        ignore_conflicts=True
+    )
+    invalidate_session(request.user.pk)
     return Response({'success': True})
 
 # Import local models and serializers
-from .models import Submission, CustomUser, UserProfile, University, Course, UserSavedCourse, Feedback, FeedbackResponse, Notification
+from .models import (
+    Submission, CustomUser, UserProfile, University, Course, UserSavedCourse, Feedback, FeedbackResponse, Notification,
+    Announcement, AnnouncementRead
+)
 from .serializers import (
     SubmissionSerializer, UserSerializer, RegisterSerializer,
-    UniversitySerializer, CourseSerializer, UserSavedCourseSerializer,
-    FeedbackSerializer, FeedbackResponseSerializer, NotificationSerializer
+    UniversitySerializer, CourseSerializer,
+    FeedbackSerializer, FeedbackResponseSerializer, NotificationSerializer,
+    AnnouncementSerializer, AnnouncementNotificationSerializer
+)
+from .notifications import notify
+from . import catalog_changes, comparison, snapshots
+from .projections import (
+    UniversityProjection, CourseProjection, UserSavedCourseProjection, FeedbackProjection, NotificationProjection
 )
+from .session import session_response, invalidate_session
+from .authentication import ClaimsRefreshToken
+from . import catalog
+from .catalog import cache_vary, conditional
+from .tiered_cache import cached_response
 
 # User profile management views
 @api_view(['POST'])
@@ -64,7 +85,7 @@ def upload_profile_picture(request):
     profile, created = UserProfile.objects.get_or_create(user=user)
     image = request.FILES.get('image')
     if image:
-        profile.image = image
+        profile.profile_picture = image
         profile.save()
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data)
@@ -80,10 +101,21 @@ from rest_framework.parsers import MultiPartParser, FormParser
 def notifications_list(request):
     """
     List notifications for the authenticated user (user or admin).
+    Announcements targeted at the user's role are merged in at read time.
     """
-    notifications = Notification.objects.filter(recipient=request.user).order_by('-created_at')
-    serializer = NotificationSerializer(notifications, many=True)
-    return Response(serializer.data)
+    projection = NotificationProjection()
+    notifications = projection.rows(Notification.objects.filter(recipient=request.user).order_by('-updated_at'))
+    # Coalesced notifications sort by their latest event; announcements never change
+    notification_times = [row['updated_at'] for row in notifications]
+    announcements = list(get_visible_announcements(request.user))
+    feed = heapq.merge(
+        zip(notification_times, projection.represent(notifications)),
+        zip([announcement.created_at for announcement in announcements],
+            AnnouncementNotificationSerializer(announcements, many=True, context={'request': request}).data),
+        key=lambda item: item[0],
+        reverse=True
+    )
+    return Response([data for _, data in feed])
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -111,6 +143,62 @@ def notifications_mark_read(request, pk):
     notification.save()
     return Response({'success': True})
 
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def notification_preferences(request):
+    """
+    Get or set whether the user receives a periodic digest instead of one
+    notification per event.
+    """
+    if request.method == 'POST':
+        digest = request.data.get('digest')
+        if not isinstance(digest, bool):
+            return Response({'error': 'digest must be true or false'}, status=status.HTTP_400_BAD_REQUEST)
+        request.user.notification_digest = digest
+        request.user.save(update_fields=['notification_digest'])
+    return Response({'digest': request.user.notification_digest})
+
+def get_visible_announcements(user):
+    """
+    Announcements targeted at the user's role (or everyone) that were sent after
+    the user joined, annotated with the user's read state.
+    """
+    return Announcement.objects.filter(
+        audience__in=['all', user.role],
+        created_at__gte=user.date_joined
+    ).annotate(
+        is_read=Exists(AnnouncementRead.objects.filter(user=user, announcement=OuterRef('pk')))
+    ).select_related('sender').order_by('-created_at')
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def announcements_create(request):
+    """
+    Broadcast an announcement to every user, or to every user with a given role.
+    The announcement is stored once; recipients see it through their notification feed.
+    """
+    is_admin = hasattr(request.user, 'role') and request.user.role in ['admin', 'superuser_admin']
+    if not (is_admin or request.user.is_superuser):
+        return Response({'error': 'Only admins can send announcements'}, status=status.HTTP_403_FORBIDDEN)
+    serializer = AnnouncementSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save(sender=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def announcement_mark_read(request, pk):
+    """
+    Mark an announcement as read for the authenticated user.
+    """
+    try:
+        announcement = get_visible_announcements(request.user).get(pk=pk)
+    except Announcement.DoesNotExist:
+        return Response({'error': 'Notification not found'}, status=status.HTTP_404_NOT_FOUND)
+    AnnouncementRead.objects.get_or_create(user=request.user, announcement=announcement)
+    return Response({'success': True})
+
 # Custom Pagination Classes
 class StandardResultsPagination(PageNumberPagination):
     page_size = 10
@@ -135,16 +223,11 @@ def submissions(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def me(request):
-    return Response({
-        'id': request.user.id,
-        'username': request.user.username,
-        'email': request.user.email,
-        'first_name': request.user.first_name,
-        'last_name': request.user.last_name,
-        'role': request.user.role,
-        'is_superuser': request.user.is_superuser,
-        'is_staff': request.user.is_staff,
-    }, status=status.HTTP_200_OK)
+    return session_response(request, lambda session: {
+        **{field: session['user'][field] for field in ('id', 'username', 'email', 'first_name', 'last_name', 'role')},
+        'is_superuser': session['is_superuser'],
+        'is_staff': session['is_staff'],
+    }, 'me')
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -153,7 +236,7 @@ def register_user(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -177,18 +260,12 @@ def login_user(request):
 
     print(f"Login attempt: {login_id}")
 
-    user = authenticate(username=login_id, password=password)
-    if not user:
-        # Try email lookup
-        try:
-            user_obj = CustomUser.objects.get(email=login_id)
-            user = authenticate(username=user_obj.username, password=password)
-        except CustomUser.DoesNotExist:
-            user = None
+    # The auth backend accepts either a username or an email address
+    user = authenticate(request, username=login_id, password=password)
 
     if user:
         print(f"User authenticated: {user.username}")
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         user_data = UserSerializer(user).data
         print(f"User data: {user_data}")
         return Response({
@@ -202,10 +279,7 @@ def login_user(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
-    print(f"Getting user profile for: {request.user.username}")
-    serializer = UserSerializer(request.user)
-    print(f"User profile data: {serializer.data}")
-    return Response(serializer.data)
+    return session_response(request, lambda session: session['user'], 'user')
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -263,7 +337,7 @@ def update_user_profile(request):
             errors['email'] = 'Email cannot be empty'
         elif not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
             errors['email'] = 'Please enter a valid email address'
-        elif email != user.email and CustomUser.objects.filter(email=email).exists():
+        elif email != user.email and CustomUser.objects.filter(email__iexact=email).exclude(pk=user.pk).exists():
             errors['email'] = 'This email is already registered'
     
     # Validate bio
@@ -352,12 +426,16 @@ def promote_to_admin(request):
     })
 
 # University and Course views
+@conditional('catalog')
 @api_view(['GET', 'POST'])
+@cached_response(settings.CATALOG_CACHE_TTL, tags=['catalog'], vary=cache_vary('catalog'))
 def list_universities(request):
     if request.method == 'GET':
-        universities = University.objects.all()
-        serializer = UniversitySerializer(universities, many=True)
-        return Response(serializer.data)
+        try:
+            projection = UniversityProjection.for_request(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(projection.data(University.objects.all()))
     
     elif request.method == 'POST':
         # Check if the user is admin
@@ -376,17 +454,25 @@ def list_universities(request):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@conditional('catalog')
 @api_view(['GET', 'PUT', 'DELETE'])
+@cached_response(settings.CATALOG_CACHE_TTL, tags=lambda request, pk: [f'university:{pk}'], vary=cache_vary('catalog'))
 def university_detail(request, pk):
+    if request.method == 'GET':
+        try:
+            projection = UniversityProjection.for_request(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = projection.data(University.objects.filter(pk=pk))
+        if not data:
+            return Response({'error': 'University not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data[0])
+
     try:
         university = University.objects.get(pk=pk)
     except University.DoesNotExist:
         return Response({'error': 'University not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    if request.method == 'GET':
-        serializer = UniversitySerializer(university)
-        return Response(serializer.data)
-    
     # Check if user is admin for modifying operations
     if not request.user.is_authenticated:
         return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -410,9 +496,15 @@ def university_detail(request, pk):
         university.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+@conditional('catalog')
 @api_view(['GET', 'POST'])
+@cached_response(settings.CATALOG_CACHE_TTL, tags=['catalog'], vary=cache_vary('catalog'))
 def list_courses(request):
     if request.method == 'GET':
+        try:
+            projection = CourseProjection.for_request(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         query = request.query_params.get('query', '')
         university_id = request.query_params.get('university', None)
         level = request.query_params.get('level', None)
@@ -432,8 +524,7 @@ def list_courses(request):
         if level:
             courses = courses.filter(level=level)
         
-        serializer = CourseSerializer(courses, many=True)
-        return Response(serializer.data)
+        return Response(projection.data(courses))
     
     elif request.method == 'POST':
         # Check if the user is admin
@@ -452,16 +543,25 @@ def list_courses(request):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@conditional('catalog')
 @api_view(['GET', 'PUT', 'DELETE'])
+@cached_response(settings.CATALOG_CACHE_TTL, tags=['catalog'], vary=cache_vary('catalog'))
 def course_detail(request, pk):
+    if request.method == 'GET':
+        try:
+            projection = CourseProjection.for_request(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = projection.data(Course.objects.filter(pk=pk))
+        if not data:
+            return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data[0])
+
     try:
         course = Course.objects.get(pk=pk)
     except Course.DoesNotExist:
         return Response({'error': 'Course not found'}, status=status.HTTP_404_NOT_FOUND)
         
-    if request.method == 'GET':
-        serializer = CourseSerializer(course)
-        return Response(serializer.data)
     
     # Check if user is admin for modifying operations
     if not request.user.is_authenticated:
@@ -484,14 +584,96 @@ def course_detail(request, pk):
         course.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+@conditional('catalog')
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def courses_batch(request):
+    """
+    Several courses in one request, with comparison data, for the comparison
+    page: /api/courses/batch/?ids=3,1,2. Courses come back in the requested
+    order; ids that do not exist are listed under `missing`.
+    """
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()))
+    except ValueError:
+        return Response({'error': 'ids must be a comma-separated list of course ids'}, status=status.HTTP_400_BAD_REQUEST)
+    if not ids:
+        return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) > settings.COURSE_BATCH_MAX_IDS:
+        return Response({'error': f'At most {settings.COURSE_BATCH_MAX_IDS} courses can be requested at once'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response(comparison.course_batch(ids, catalog.version('catalog', request)))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def catalog_version(request):
+    """
+    Current catalog version, and with ?universities=1,2 the version of each
+    of those universities (the catalog version of its last change).
+    """
+    try:
+        ids = [int(pk) for pk in request.query_params.get('universities', '').split(',') if pk.strip()]
+    except ValueError:
+        return Response({'error': 'universities must be a comma-separated list of university ids'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    data = {'version': catalog_changes.current_version()}
+    if ids:
+        data['universities'] = {str(pk): version for pk, version in catalog_changes.university_versions(ids).items()}
+    return Response(data)
+
+@conditional('catalog')
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@cached_response(settings.CATALOG_CACHE_TTL, tags=['catalog'], vary=cache_vary('catalog'))
+def catalog_changes_feed(request):
+    """
+    Universities and courses created or updated after ?since=<version>, and
+    the ids of those deleted since, from the change log. Without `since`
+    the whole catalog is returned. Clients keep the returned `version` for
+    their next call, and call again straight away while `more` is true.
+    """
+    since = request.query_params.get('since', '0')
+    if not since.isdigit():
+        return Response({'error': 'since must be a catalog version'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(catalog_changes.changes_since(int(since), settings.CATALOG_CHANGES_PAGE_SIZE))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def catalog_snapshot(request):
+    """
+    Where the current catalog snapshot lives: its catalog version and the
+    URLs of its files, which never change. Clients load one and continue
+    with /api/catalog/changes/?since=<version>, so an older snapshot is
+    still served while a newer one is built.
+    """
+    manifest = snapshots.read_manifest()
+    # Catches changes whose build was lost, e.g. with the process that made them
+    stale = manifest is None or manifest['version'] < catalog_changes.current_version()
+    if stale and settings.CATALOG_SNAPSHOT_AUTO_BUILD:
+        snapshots.builder.request()
+    if manifest is None:
+        return Response({'error': 'No catalog snapshot has been built yet'}, status=status.HTTP_404_NOT_FOUND)
+    files = snapshots.storage()
+    response = Response({
+        'version': manifest['version'],
+        'hash': manifest['hash'],
+        'files': {ext: request.build_absolute_uri(files.url(name)) for ext, name in manifest['files'].items()},
+    })
+    # The manifest moves on with every build
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 # User saved courses
 @api_view(['GET', 'POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def user_saved_courses(request):
     if request.method == 'GET':
+        try:
+            projection = UserSavedCourseProjection.for_request(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         saved_courses = UserSavedCourse.objects.filter(user=request.user)
-        serializer = UserSavedCourseSerializer(saved_courses, many=True)
-        return Response(serializer.data)
+        return Response(projection.data(saved_courses))
     
     elif request.method == 'POST':
         course_id = request.data.get('course_id')
@@ -540,7 +722,7 @@ def list_users(request):
 
         # Get all users
         users = CustomUser.objects.all()
-        serializer = UserSerializer(users, many=True)
+        serializer = UserSerializer(users, many=True, context={'avatar_size': 48})
         print(f"Sending {len(users)} users to admin dashboard")
         return Response(serializer.data)
     except Exception as e:
@@ -601,6 +783,10 @@ def user_detail(request, pk):
 @permission_classes([IsAuthenticated])
 def feedback_list(request):
     if request.method == 'GET':
+        try:
+            projection = FeedbackProjection.for_request(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         try:
             # Check if user is admin using CustomUser.role
             if hasattr(request.user, 'role') and request.user.role in ['admin', 'superuser_admin']:
@@ -609,8 +795,7 @@ def feedback_list(request):
             else:
                 feedbacks = Feedback.objects.filter(user=request.user).order_by('-created_at')
                 
-            serializer = FeedbackSerializer(feedbacks, many=True)
-            return Response(serializer.data)
+            return Response(projection.data(feedbacks))
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
@@ -620,14 +805,13 @@ def feedback_list(request):
         if serializer.is_valid():
             feedback = serializer.save(user=request.user)
             # Notify all admins when feedback is submitted
-            admins = CustomUser.objects.filter(role__in=['admin', 'superuser_admin'])
-            for admin in admins:
-                Notification.objects.create(
-                    recipient=admin,
-                    sender=request.user,
-                    message=f"New feedback submitted by {request.user.username}: {feedback.subject}",
-                    type='feedback'
-                )
+            admins = CustomUser.objects.filter(role__in=['admin', 'superuser_admin']).only('id', 'notification_digest')
+            notify(
+                admins,
+                sender=request.user,
+                message=f"New feedback submitted by {request.user.username}: {feedback.subject}",
+                type='feedback'
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -646,8 +830,11 @@ def feedback_detail(request, pk):
                         status=status.HTTP_403_FORBIDDEN)
     
     if request.method == 'GET':
-        serializer = FeedbackSerializer(feedback)
-        return Response(serializer.data)
+        try:
+            projection = FeedbackProjection.for_request(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(projection.data(Feedback.objects.filter(pk=pk))[0])
     
     if request.method == 'PUT':
         # Allow admin or the feedback creator to update feedback (e.g., mark as resolved)
@@ -692,8 +879,8 @@ def feedback_response_create(request, feedback_id):
         feedback.is_resolved = True
         feedback.save()
         # Notify the feedback owner when admin responds
-        Notification.objects.create(
-            recipient=feedback.user,
+        notify(
+            [feedback.user],
             sender=request.user,
             message=f"Your feedback '{feedback.subject}' has a new response from admin.",
             type='feedback_response'
@@ -702,21 +889,27 @@ def feedback_response_create(request, feedback_id):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@conditional('feedback')
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_response(settings.CATALOG_CACHE_TTL, tags=['feedback'], vary=cache_vary('feedback'))
 def featured_feedback(request):
     """
     Get a list of featured feedback entries with admin responses.
     This endpoint is used for the homepage sidebar.
     """
+    try:
+        projection = FeedbackProjection.for_request(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     # Get feedback that has responses and is resolved
     featured = Feedback.objects.filter(
         is_resolved=True, 
         responses__isnull=False
     ).distinct().order_by('-created_at')[:5]
     
-    serializer = FeedbackSerializer(featured, many=True)
-    return Response(serializer.data)
+    return Response(projection.data(featured))
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -1,18 +1,23 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import authenticate, update_session_auth_hash
 from django.conf import settings
 from django.middleware.csrf import get_token
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.http import JsonResponse
-import os
+from django.core.files.storage import default_storage
 from .models import CustomUser, UserProfile
 from .serializers import RegisterSerializer, UserSerializer
+from .authentication import ClaimsRefreshToken
+from .session import session_response
+from .ratelimit import LoginThrottle, LoginAccountThrottle
+from .images import InvalidImage, store_avatar, release_avatar
 
 
 def set_jwt_cookies(response, access_token, refresh_token):
@@ -78,7 +83,7 @@ def register_view(request):
         user = serializer.save()
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         access = refresh.access_token
         
         # Prepare response
@@ -96,6 +101,7 @@ def register_view(request):
 
 
 @api_view(['POST'])
+@throttle_classes([LoginThrottle, LoginAccountThrottle])
 @permission_classes([AllowAny])
 def login_view(request):
     """
@@ -130,25 +136,13 @@ def login_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Allow login with either username or email
-    if email and not username:
-        user_obj = CustomUser.objects.filter(email=email).first()
-        logger.debug(f"[login_view] Found user by email: {user_obj}")
-        if not user_obj:
-            logger.warning(f"[login_view] No user found for email: {email}")
-            return Response(
-                {'error': 'Invalid credentials'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        username = user_obj.username
-        
-    # Authenticate user
-    user = authenticate(username=username, password=password)
+    # Authenticate user; the auth backend accepts either a username or an email
+    user = authenticate(request, username=username or email, password=password)
     logger.debug(f"[login_view] authenticate() returned: {user}")
     
     if user is not None:
         logger.info(f"[login_view] User authenticated: {user.username}")
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         access = refresh.access_token
         
         # Check if this is a token fallback request
@@ -256,8 +250,7 @@ def current_user_view(request):
     """
     Get current authenticated user
     """
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
+    return session_response(request, lambda session: session['user'], 'user')
 
 
 @api_view(['POST'])
@@ -280,8 +273,16 @@ def refresh_token_view(request):
     
     try:
         # Create new refresh token instance
-        token = RefreshToken(refresh_token)
+        token = ClaimsRefreshToken(refresh_token)
         logger.debug(f"[refresh_token_view] RefreshToken object created successfully.")
+        # The new access token's claims come from the current row, not the refresh token
+        token.user = CustomUser.objects.filter(pk=token[jwt_settings.USER_ID_CLAIM]).first()
+        if token.user is None or not token.user.is_active:
+            logger.warning("[refresh_token_view] Refresh token belongs to a missing or inactive user.")
+            return Response(
+                {'error': 'Invalid or expired refresh token'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
         # Get new access token
         access = token.access_token
         logger.debug(f"[refresh_token_view] New access token generated.")
@@ -364,8 +365,8 @@ def upload_profile_picture(request):
     user = request.user
     # Fallback: If user is not authenticated, try to authenticate via JWT in cookie
     if not user or not user.is_authenticated:
-        from rest_framework_simplejwt.authentication import JWTAuthentication
-        jwt_auth = JWTAuthentication()
+        from .authentication import JWTCookieAuthentication
+        jwt_auth = JWTCookieAuthentication()
         auth_result = jwt_auth.authenticate(request)
         if auth_result:
             user = auth_result[0]
@@ -375,31 +376,32 @@ def upload_profile_picture(request):
         # Get or create user profile
         profile, created = UserProfile.objects.get_or_create(user=user)
         
-        # Delete old image if exists to save storage
-        if profile.profile_picture and hasattr(profile.profile_picture, 'path'):
-            try:
-                if os.path.isfile(profile.profile_picture.path):
-                    os.remove(profile.profile_picture.path)
-            except Exception as e:
-                logger.error(f"[upload_profile_picture] Error deleting old profile picture: {e}")
-        
-        # Also check the legacy image field
-        if profile.image and hasattr(profile.image, 'path'):
-            try:
-                if os.path.isfile(profile.image.path):
-                    os.remove(profile.image.path)
-            except Exception as e:
-                logger.error(f"[upload_profile_picture] Error deleting old image: {e}")
+        # Decode, strip and resize the upload into its stored variants
+        try:
+            avatar_hash = store_avatar(request.FILES['image'])
+        except InvalidImage as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Clear both image fields
-        profile.image = None
+        old_hash = profile.avatar_hash
+        legacy_picture = profile.profile_picture.name if profile.profile_picture else None
         
-        # Save new image
-        profile.profile_picture = request.FILES['image']
+        # Only the processed variants are kept
+        profile.profile_picture = None
+        profile.avatar_hash = avatar_hash
         profile.save()
         
+        # Old files go only once the profile points at the new ones; unreferenced
+        # variants are deleted later by `manage.py collect_media_garbage`
+        if old_hash:
+            release_avatar(old_hash)
+        if legacy_picture:
+            try:
+                default_storage.delete(legacy_picture)
+            except Exception as e:
+                logger.error(f"[upload_profile_picture] Error deleting old profile picture: {e}")
+        
         # Return the URL of the new profile picture
-        profile_url = profile.profile_picture.url if profile.profile_picture else None
+        profile_url = UserSerializer(user).data['profile_picture']
         logger.info(f"[upload_profile_picture] New profile picture URL: {profile_url}")
         
         response_data = {
@@ -527,8 +529,8 @@ def update_name(request):
     user = request.user
     # Fallback: If user is not authenticated, try to authenticate via JWT in cookie
     if not user or not user.is_authenticated:
-        from rest_framework_simplejwt.authentication import JWTAuthentication
-        jwt_auth = JWTAuthentication()
+        from .authentication import JWTCookieAuthentication
+        jwt_auth = JWTCookieAuthentication()
         auth_result = jwt_auth.authenticate(request)
         if auth_result:
             user = auth_result[0]
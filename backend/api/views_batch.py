@@ -0,0 +1,142 @@
+"""
+Batched reads: POST /api/batch/ with
+
+    {"requests": [{"method": "GET", "path": "/api/me/"},
+                  {"path": "/api/courses/", "query": {"fields": "id,name"}}]}
+
+answers every sub-request in one response, as {"responses": [{"status":
+200, "body": ...}, ...]} in the same order. Sub-requests are resolved with
+the URL resolver and call their views directly, skipping the middleware
+stack. They are authenticated once: the batch request's user and token are
+handed to each sub-request through the memo that JWTCookieAuthentication
+already keeps on the request.
+
+Only reads (GET, HEAD) under /api/ can be batched; anything else gets its
+own error status in its slot and does not fail the rest of the batch. Up to
+BATCH_CONCURRENCY sub-requests run at once, each in a worker thread with its
+own database connection; with BATCH_CONCURRENCY = 1 they run one after
+another in the request's thread.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import close_old_connections
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+BATCH_METHODS = ('GET', 'HEAD')
+
+# Request headers that describe the batch request itself, not its sub-requests
+BATCH_ONLY_META = {
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_MATCH',
+    'HTTP_IF_UNMODIFIED_SINCE', 'HTTP_RANGE', 'HTTP_IF_RANGE',
+}
+
+
+def _error(status_code, message):
+    return {'status': status_code, 'body': {'error': message}}
+
+
+def _subrequest(request, method, path, query):
+    sub = HttpRequest()
+    sub.method = method
+    sub.path = sub.path_info = path
+    sub.META = {key: value for key, value in request.META.items() if key not in BATCH_ONLY_META}
+    sub.META.update(REQUEST_METHOD=method, PATH_INFO=path, QUERY_STRING=query.urlencode(), HTTP_ACCEPT='application/json')
+    sub.GET = query
+    sub.COOKIES = request.COOKIES
+    sub._body = b''
+    sub.user = request.user
+    # Read by JWTCookieAuthentication instead of decoding the token again
+    sub._jwt_auth_result = (request.user, request.auth) if request.user.is_authenticated else None
+    return sub
+
+
+def _dispatch(request, item):
+    """Run one sub-request and return its slot in the batch response"""
+    method = str(item.get('method', 'GET')).upper()
+    path, _, query_string = str(item.get('path', '')).partition('?')
+    if method not in BATCH_METHODS:
+        return _error(status.HTTP_405_METHOD_NOT_ALLOWED, f'{method} requests cannot be batched')
+    if not path.startswith('/api/'):
+        return _error(status.HTTP_404_NOT_FOUND, 'Not found')
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return _error(status.HTTP_404_NOT_FOUND, 'Not found')
+    if match.url_name == 'batch':
+        return _error(status.HTTP_400_BAD_REQUEST, 'Batches cannot be nested')
+
+    query = QueryDict(query_string, mutable=True)
+    for key, value in (item.get('query') or {}).items():
+        query.setlist(key, [str(v) for v in value] if isinstance(value, list) else [str(value)])
+
+    try:
+        response = match.func(_subrequest(request, method, path, query), *match.args, **match.kwargs)
+    except Http404:
+        return _error(status.HTTP_404_NOT_FOUND, 'Not found')
+    except PermissionDenied:
+        return _error(status.HTTP_403_FORBIDDEN, 'Permission denied')
+    except Exception:
+        logger.exception("Batched request to %s failed", path)
+        return _error(status.HTTP_500_INTERNAL_SERVER_ERROR, 'Internal server error')
+
+    try:
+        if method == 'HEAD':
+            body = None
+        elif hasattr(response, 'data'):
+            # DRF responses are not rendered yet; their data goes into the batch as-is
+            body = response.data
+        elif response.streaming:
+            return _error(status.HTTP_400_BAD_REQUEST, 'Streaming responses cannot be batched')
+        else:
+            body = response.content.decode(response.charset)
+        return {'status': response.status_code, 'body': body}
+    finally:
+        response.close()
+
+
+def _dispatch_in_thread(request, item):
+    try:
+        return _dispatch(request, item)
+    finally:
+        close_old_connections()
+
+
+async def _gather(request, items, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    dispatch = sync_to_async(_dispatch_in_thread, thread_sensitive=False)
+
+    async def run(item):
+        async with semaphore:
+            return await dispatch(request, item)
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def batch(request):
+    items = request.data.get('requests') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return Response({'error': 'requests must be a non-empty list of objects'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        return Response({'error': f'At most {settings.BATCH_MAX_REQUESTS} requests can be batched'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    # Authenticate here, once, before the sub-requests share the result
+    request.user
+    concurrency = min(settings.BATCH_CONCURRENCY, len(items))
+    if concurrency <= 1:
+        responses = [_dispatch(request, item) for item in items]
+    else:
+        responses = async_to_sync(_gather)(request, items, concurrency)
+    return Response({'responses': responses})
@@ -11,23 +11,21 @@ from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
 from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
 from rest_framework.response import Response
 from rest_framework import status
 
 from .models import ChatSession, ChatMessage
 from .grok_client import grok_client
+from .ratelimit import AnonIPThrottle, GCRAThrottle
 
 
-class ChatMessageThrottle(AnonRateThrottle):
-    """Rate limiting for anonymous chat users: 20/minute"""
-    rate = '20/minute'
+class ChatMessageThrottle(AnonIPThrottle):
+    """Rate limiting for anonymous chat users (RATELIMIT_POLICIES['chat_message'])"""
     scope = 'chat_message'
     
 
-class AuthenticatedChatMessageThrottle(UserRateThrottle):
-    """Rate limiting for authenticated chat users: 60/minute"""
-    rate = '60/minute'
+class AuthenticatedChatMessageThrottle(GCRAThrottle):
+    """Rate limiting for authenticated chat users (RATELIMIT_POLICIES['auth_chat_message'])"""
     scope = 'auth_chat_message'
 
 
@@ -0,0 +1,177 @@
+"""
+Serving of user-uploaded media under MEDIA_URL.
+
+With MEDIA_SENDFILE set, the response only names the file and the web server
+sends it (X-Sendfile for Apache/lighttpd, X-Accel-Redirect for nginx), taking
+care of Range and conditional requests itself, so Python never touches the
+file. Otherwise the file is streamed from Django, which also answers
+conditional requests with a 304 and single-range requests with a 206.
+
+Content-hashed names (the avatar variants, see api/images.py, and the
+catalog snapshots, see api/snapshots.py) never change content, so they are
+marked cacheable forever; anything else must be revalidated on each use.
+A compressible file stored with precompressed copies beside it (name.br,
+name.zst, name.gz) is answered with the copy the client accepts, in both
+modes: the web server is pointed at the copy, with the Content-Type of the
+original and the copy's Content-Encoding already set.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .middleware import COMPRESSIBLE_TYPES, parse_accept_encoding
+from .snapshots import ENCODING_SUFFIXES
+
+mimetypes.add_type('application/msgpack', '.msgpack')
+
+IMMUTABLE_NAME = re.compile(r'(^|/)[0-9a-f]{32}_\d+\.\w+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileSlice:
+    """Read-only view of `length` bytes of a file, starting at its current position"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) (inclusive) for a single satisfiable byte range,
+    None to serve the whole file, or False if the range is unsatisfiable.
+    """
+    match = RANGE_HEADER.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        # Malformed or multiple ranges: ignoring the header is allowed
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _sendfile_response(path, full_path, content_type):
+    backend = settings.MEDIA_SENDFILE
+    response = HttpResponse(content_type=content_type)
+    if backend == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_LOCATION.rstrip('/') + '/' + path
+    elif backend == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        raise ValueError(f"Unknown MEDIA_SENDFILE backend: {backend}")
+    return response
+
+
+def _precompressed(request, path, full_path):
+    """The best precompressed copy of the file the client accepts, as (encoding, full path, stat)"""
+    if not COMPRESSIBLE_TYPES.match(mimetypes.guess_type(path)[0] or ''):
+        return None
+    accepted = parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+    for encoding, suffix in sorted(ENCODING_SUFFIXES.items(), key=lambda item: -accepted.get(item[0], 0)):
+        if accepted.get(encoding, 0) <= 0:
+            break
+        try:
+            st = os.stat(full_path + suffix)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            return encoding, full_path + suffix, st
+    return None
+
+
+def _file_response(request, path, full_path, st):
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if response is not None:
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    if 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(request.headers['Range'], st.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{st.st_size}'
+        return response
+
+    file = open(full_path, 'rb')
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if byte_range:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(FileSlice(file, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        response = FileResponse(file, content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(st.st_mtime)
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path')
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if getattr(settings, 'MEDIA_SENDFILE', None):
+        precompressed = _precompressed(request, path, full_path)
+        if precompressed:
+            suffix = ENCODING_SUFFIXES[precompressed[0]]
+            response = _sendfile_response(path + suffix, full_path + suffix, content_type)
+            response['Content-Encoding'] = precompressed[0]
+        else:
+            response = _sendfile_response(path, full_path, content_type)
+    else:
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            raise Http404('Media file not found')
+        if not stat.S_ISREG(st.st_mode):
+            raise Http404('Media file not found')
+        precompressed = _precompressed(request, path, full_path)
+        if precompressed:
+            encoding, full_path, st = precompressed
+        response = _file_response(request, path, full_path, st)
+        if precompressed and response.status_code in (200, 206):
+            response['Content-Encoding'] = encoding
+    if COMPRESSIBLE_TYPES.match(content_type):
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+    if response.status_code in (200, 206, 304):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if IMMUTABLE_NAME.search(path) else REVALIDATE_CACHE_CONTROL
+    return response
@@ -0,0 +1,18 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+from . import user_cache
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def metrics(request):
+    """
+    Runtime metrics for admins. Counters are per worker process.
+    """
+    is_admin = request.user.is_superuser or getattr(request.user, 'role', None) in ['admin', 'superuser_admin']
+    if not is_admin:
+        return Response({'error': 'Only admins can view metrics'}, status=status.HTTP_403_FORBIDDEN)
+    return Response({
+        'user_cache': user_cache.stats(),
+    })
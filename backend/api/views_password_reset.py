@@ -1,20 +1,30 @@
 import random
 import string
+from datetime import timedelta
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
 from .models import PasswordResetCode
+from .outbox import enqueue
+from .ratelimit import (
+    PasswordResetThrottle, PasswordResetAccountThrottle,
+    PasswordResetVerifyThrottle, PasswordResetVerifyAccountThrottle,
+)
 
 User = get_user_model()
 
 
 @api_view(['POST'])
+@throttle_classes([PasswordResetThrottle, PasswordResetAccountThrottle])
 @permission_classes([AllowAny])
 def request_reset(request):
     """
@@ -22,40 +32,41 @@ def request_reset(request):
     """
     email = request.data.get('email')
     
-    if not email:
+    if not email or not isinstance(email, str):
         return Response({'error': 'Email is required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        user = User.objects.get(email=email)
-    except User.DoesNotExist:
+    # Case-insensitive, like email logins, through the same partial index (see api/backends.py)
+    user = User.objects.alias(email_lower=Lower('email')).filter(email_lower=email.lower()).exclude(email='').first()
+    if user is None:
         # Don't reveal if email exists or not for security
         return Response({'message': 'If the email exists, a reset code has been sent'}, status=status.HTTP_200_OK)
     
     # Generate a 6-digit code
     code = ''.join(random.choices(string.digits, k=6))
     
-    # Delete any existing reset codes for this user
-    PasswordResetCode.objects.filter(user=user).delete()
+    ttl = getattr(settings, 'PASSWORD_RESET_CODE_TTL', timedelta(minutes=15))
     
-    # Create new reset code
-    PasswordResetCode.objects.create(user=user, code=code)
-    
-    # Send email with reset code
-    try:
-        send_mail(
+    with transaction.atomic():
+        # Reuse the user's code row if there is one, which also invalidates the previous code
+        replaced = PasswordResetCode.objects.filter(user=user).update(
+            code=code, created_at=timezone.now(), expires_at=timezone.now() + ttl, attempts=0
+        )
+        if not replaced:
+            PasswordResetCode.objects.create(user=user, code=code, expires_at=timezone.now() + ttl)
+        
+        # Queue the email; the outbox worker sends it (see api/outbox.py)
+        enqueue(
             'Password Reset Code',
-            f'Your password reset code is: {code}\n\nThis code will expire in 15 minutes.',
-            settings.EMAIL_HOST_USER,
-            [email],
-            fail_silently=False,
+            f'Your password reset code is: {code}\n\nThis code will expire in {int(ttl.total_seconds() // 60)} minutes.',
+            [user.email],
+            from_email=settings.EMAIL_HOST_USER
         )
-    except Exception as e:
-        return Response({'error': 'Failed to send email'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     return Response({'message': 'Reset code sent to your email'}, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
+@throttle_classes([PasswordResetVerifyThrottle, PasswordResetVerifyAccountThrottle])
 @permission_classes([AllowAny])
 def verify_code_reset(request):
     """
@@ -65,30 +76,27 @@ def verify_code_reset(request):
     code = request.data.get('code')
     new_password = request.data.get('new_password')
     
-    if not all([email, code, new_password]):
+    if not all([email, code, new_password]) or not isinstance(email, str):
         return Response({'error': 'Email, code, and new password are required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        user = User.objects.get(email=email)
-    except User.DoesNotExist:
-        return Response({'error': 'Invalid email or code'}, status=status.HTTP_400_BAD_REQUEST)
+    # Only live codes that have not run out of attempts match
+    live_codes = PasswordResetCode.objects.alias(email_lower=Lower('user__email')).filter(
+        email_lower=email.lower(),
+        expires_at__gt=timezone.now(),
+        attempts__lt=getattr(settings, 'PASSWORD_RESET_MAX_ATTEMPTS', 5)
+    )
+    reset_code = live_codes.filter(code=code).select_related('user').first()
+    if reset_code is None:
+        # Count the wrong guess against the account's live code
+        live_codes.update(attempts=F('attempts') + 1)
+        return Response({'error': 'Invalid email or code, or the code has expired'}, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        reset_code = PasswordResetCode.objects.get(user=user, code=code)
-        
-        # Check if code has expired (15 minutes)
-        if reset_code.is_expired():
-            reset_code.delete()
-            return Response({'error': 'Reset code has expired'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Update user password
-        user.password = make_password(new_password)
-        user.save()
-        
-        # Delete the used reset code
-        reset_code.delete()
-        
-        return Response({'message': 'Password reset successful'}, status=status.HTTP_200_OK)
-        
-    except PasswordResetCode.DoesNotExist:
-        return Response({'error': 'Invalid email or code'}, status=status.HTTP_400_BAD_REQUEST)
+    # Update user password
+    user = reset_code.user
+    user.password = make_password(new_password)
+    user.save()
+    
+    # Delete the used reset code
+    reset_code.delete()
+    
+    return Response({'message': 'Password reset successful'}, status=status.HTTP_200_OK)
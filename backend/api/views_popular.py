@@ -2,8 +2,13 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .models import University, Course
+from django.conf import settings
+from .catalog import cache_vary, conditional
+from .tiered_cache import cached_response
 
+@conditional('catalog')
 @api_view(['GET'])
+@cached_response(settings.CATALOG_CACHE_TTL, tags=['catalog'], vary=cache_vary('catalog'))
 def popular_items(request):
     """
     Get popular universities and courses
@@ -2,7 +2,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import UserSerializer
+from .session import session_response
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -10,9 +10,20 @@ def verify_auth(request):
     """
     Simple endpoint to verify if a user's authentication is still valid.
     Returns user details if authenticated, used by frontend to verify token validity.
+    Supports If-None-Match, so repeat verifications are 304s.
     """
-    return Response({
+    return session_response(request, lambda session: {
         'isAuthenticated': True,
-        'user': UserSerializer(request.user).data,
+        'user': session['user'],
         'message': 'Authentication verified'
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+    }, 'verify')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def session_bootstrap(request):
+    """
+    Everything the frontend needs to start a session in one response: user
+    identity and role, profile picture, unread notification count and saved
+    course ids. Supports If-None-Match.
+    """
+    return session_response(request, lambda session: dict(session, isAuthenticated=True), 'bootstrap')
\ No newline at end of file
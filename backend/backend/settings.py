@@ -1,3 +1,4 @@
+import importlib.util
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -169,6 +170,8 @@ SESSION_COOKIE_DOMAIN = None  # Don't restrict domain in development
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compresses responses once every other middleware has set the body
+    'api.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Moved up before CommonMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -209,6 +212,26 @@ DATABASES = {
     }
 }
 
+# 'default' is private to each process. 'shared' is seen by every process and
+# is the second tier of api/tiered_cache.py; the database cache keeps it in
+# SQLite next to the data (its table is created by the api migrations). Point
+# CACHE_SHARED_BACKEND/CACHE_SHARED_LOCATION at Redis or memcached to share
+# it across machines.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': os.getenv('CACHE_SHARED_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CACHE_SHARED_LOCATION', 'api_shared_cache'),
+    },
+}
+
+
+# Log in with either username or email (see api/backends.py)
+AUTHENTICATION_BACKENDS = [
+    'api.backends.UsernameOrEmailBackend',
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -255,6 +278,18 @@ if not os.path.exists(MEDIA_ROOT):
     os.makedirs(MEDIA_ROOT)
     os.makedirs(os.path.join(MEDIA_ROOT, 'profile_pics'))
 
+# Let the web server send media files: 'x-accel-redirect' (nginx) or
+# 'x-sendfile' (Apache mod_xsendfile, lighttpd). For nginx, map
+# MEDIA_ACCEL_REDIRECT_LOCATION to MEDIA_ROOT with an internal location:
+#     location /protected-media/ { internal; alias /path/to/media/; }
+# Leave as None to stream files from Django.
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+MEDIA_ACCEL_REDIRECT_LOCATION = '/protected-media/'
+
+# How long processed media must go unreferenced before `manage.py
+# collect_media_garbage` deletes it (see api/images.py)
+MEDIA_GC_GRACE = timedelta(hours=1)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -273,16 +308,126 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 if DEBUG:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Password reset codes stop working after this long or after this many wrong
+# guesses; `manage.py sweep_reset_codes` deletes expired ones
+PASSWORD_RESET_CODE_TTL = timedelta(minutes=15)
+PASSWORD_RESET_MAX_ATTEMPTS = 5
+
+# Email outbox (api/outbox.py), drained by `manage.py send_queued_email`.
+# To try it against a local SMTP sink, run `python -m aiosmtpd -n -l localhost:1025`
+# and set EMAIL_HOST=localhost, EMAIL_PORT=1025, EMAIL_USE_TLS=False.
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+# Delay before the first retry; it doubles per failed attempt up to OUTBOX_MAX_BACKOFF
+OUTBOX_RETRY_BACKOFF = timedelta(seconds=30)
+OUTBOX_MAX_BACKOFF = timedelta(hours=1)
+
 # Rest Framework settings
+BINARY_FORMATS = [
+    (package, renderer, parser) for package, renderer, parser in (
+        ('msgpack', 'api.renderers.MessagePackRenderer', 'api.renderers.MessagePackParser'),
+        ('cbor2', 'api.renderers.CBORRenderer', 'api.renderers.CBORParser'),
+    ) if importlib.util.find_spec(package)
+]
+BINARY_RENDERER_CLASSES = [renderer for _, renderer, _ in BINARY_FORMATS]
+BINARY_PARSER_CLASSES = [parser for _, _, parser in BINARY_FORMATS]
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        # Handles both the access_token cookie and the Authorization header
         'api.authentication.JWTCookieAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
+    # orjson-backed JSON with the same output as DRF's; falls back to the
+    # stock classes when orjson is not installed (api/renderers.py).
+    # MessagePack and CBOR are offered when their packages are installed.
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        *BINARY_RENDERER_CLASSES,
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.renderers.FastJSONParser',
+        *BINARY_PARSER_CLASSES,
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
+
+# Seconds an authenticated user row stays in the auth user cache (api/user_cache.py)
+AUTH_USER_CACHE_TTL = 60
+
+# Tiered cache (api/tiered_cache.py): entries kept per process, seconds an
+# entry is trusted before being checked against the shared cache again, the
+# shared cache alias, XFetch early-expiry factor (0 disables it) and how long
+# a process refreshing an entry holds its lock. Cached catalog and feedback
+# responses live for CATALOG_CACHE_TTL seconds unless invalidated first.
+TIERED_CACHE_L1_SIZE = 1000
+TIERED_CACHE_L1_TTL = 5
+TIERED_CACHE_L2 = 'shared'
+TIERED_CACHE_BETA = 1.0
+TIERED_CACHE_LOCK_TIMEOUT = 10
+CATALOG_CACHE_TTL = 600
+
+# Seconds the session data behind auth/session/, auth/verify/ and the other
+# identity endpoints is cached (api/session.py); changes invalidate it earlier
+SESSION_DATA_CACHE_TTL = 300
+
+# Build request.user from access token claims (id, username, role, staff flags)
+# instead of reading the user row; other fields are loaded only when touched.
+# Role and staff changes then take effect when the user's token is next issued,
+# so the mode is refused (api/checks.py) and ignored unless access tokens
+# expire within AUTH_TOKEN_CLAIMS_MAX_LIFETIME.
+AUTH_TOKEN_CLAIMS = False
+AUTH_TOKEN_CLAIMS_MAX_LIFETIME = timedelta(minutes=15)
+
+# Unread notifications of a coalescable type arriving within this window are
+# merged into one rolling aggregate (see api/notifications.py)
+NOTIFICATION_COALESCE_WINDOW = timedelta(minutes=30)
+
+# Responses smaller than this many bytes are not compressed, and compressed
+# bodies of responses with an ETag are cached for COMPRESSION_CACHE_TTL seconds
+# (api/middleware.py). Install `brotli` or `zstandard` to offer br or zstd.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_CACHE_TTL = 300
+
+# /api/courses/batch/ accepts up to COURSE_BATCH_MAX_IDS ids; its payloads are
+# cached per id set for COURSE_BATCH_CACHE_TTL seconds or until the catalog changes
+COURSE_BATCH_MAX_IDS = 50
+COURSE_BATCH_CACHE_TTL = 3600
+
+# Rows per page of /api/catalog/changes/ (a single catalog version is never split)
+CATALOG_CHANGES_PAGE_SIZE = 1000
+
+# Catalog snapshots (api/snapshots.py) are rebuilt in the background
+# CATALOG_SNAPSHOT_DELAY seconds after a catalog change, when
+# CATALOG_SNAPSHOT_AUTO_BUILD is on; the newest CATALOG_SNAPSHOT_KEEP are kept
+CATALOG_SNAPSHOT_AUTO_BUILD = True
+CATALOG_SNAPSHOT_DELAY = 2
+CATALOG_SNAPSHOT_KEEP = 3
+
+# /api/batch/ takes up to BATCH_MAX_REQUESTS sub-requests and runs up to
+# BATCH_CONCURRENCY of them at once (api/views_batch.py)
+BATCH_MAX_REQUESTS = 20
+BATCH_CONCURRENCY = 4
+
+# Rate limits per throttle scope, as 'N/period' (see api/ratelimit.py). Up to
+# N requests may arrive at once; after that they are spaced period/N apart.
+RATELIMIT_POLICIES = {
+    'login': '20/minute',
+    'login_account': '10/minute',
+    'password_reset': '5/hour',
+    'password_reset_account': '3/hour',
+    'password_reset_verify': '20/hour',
+    'password_reset_verify_account': '10/hour',
+    'chat_message': '20/minute',
+    'auth_chat_message': '60/minute',
 }
+# 'database' for exact limits shared through the database, or 'cache' to keep
+# buckets in the Django cache named by RATELIMIT_CACHE
+RATELIMIT_STORE = 'database'
+RATELIMIT_CACHE = 'default'
 
 LOGGING = {
     'version': 1,
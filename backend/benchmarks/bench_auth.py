@@ -0,0 +1,41 @@
+"""
+Per-request authentication overhead.
+
+Resolves `request.user` through the configured DEFAULT_AUTHENTICATION_CLASSES
+for a token in the cookie, a token in the Authorization header, a bad token,
+and an anonymous request.
+"""
+from common import setup, bench
+
+setup()
+
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from api.models import CustomUser
+
+factory = APIRequestFactory()
+user = CustomUser.objects.create_user(username='bench', email='bench@example.com')
+token = str(RefreshToken.for_user(user).access_token)
+
+
+def resolve(cookie=None, **headers):
+    def run():
+        django_request = factory.get('/api/me/', **headers)
+        if cookie:
+            django_request.COOKIES['access_token'] = cookie
+        request = Request(django_request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            request.user
+        except Exception:
+            pass
+    return run
+
+
+if __name__ == '__main__':
+    print('Authentication classes:', ', '.join(c.__name__ for c in api_settings.DEFAULT_AUTHENTICATION_CLASSES))
+    bench('valid token in cookie', resolve(cookie=token))
+    bench('valid token in Authorization header', resolve(HTTP_AUTHORIZATION=f'Bearer {token}'))
+    bench('bad token in cookie and header', resolve(cookie='bad.token.value', HTTP_AUTHORIZATION='Bearer bad.token.value'))
+    bench('anonymous', resolve())
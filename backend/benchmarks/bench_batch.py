@@ -0,0 +1,50 @@
+"""
+The admin dashboard's reads (/api/me/, /api/universities/, /api/courses/,
+/api/users/) as four requests through the full middleware stack, against one
+POST to /api/batch/.
+
+The in-memory database is private to the request thread, so the batch runs
+with BATCH_CONCURRENCY = 1 here; this measures the per-request overhead that
+batching saves, not the overlap of concurrent reads.
+"""
+from common import setup, bench
+
+setup()
+
+import json
+
+from django.conf import settings
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+from api.models import CustomUser, University, Course
+
+settings.BATCH_CONCURRENCY = 1
+admin = CustomUser.objects.create_user(username='admin', email='admin@example.com', role='admin')
+universities = University.objects.bulk_create([
+    University(name=f'University {i}', description='D', location='Kathmandu', ranking=i, website='https://bench.example.com')
+    for i in range(20)
+])
+Course.objects.bulk_create([
+    Course(university=university, name=f'Course {j}', description='D', duration='4 years', fees=125000 + j, level='Undergraduate')
+    for university in universities for j in range(5)
+])
+CustomUser.objects.bulk_create([CustomUser(username=f'user{i}', email=f'user{i}@example.com') for i in range(20)])
+
+client = Client(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(admin)}')
+PATHS = ['/api/me/', '/api/universities/', '/api/courses/', '/api/users/']
+BATCH = json.dumps({'requests': [{'path': path} for path in PATHS]})
+
+
+def separate():
+    for path in PATHS:
+        assert client.get(path).status_code == 200
+
+
+def batched():
+    response = client.post('/api/batch/', BATCH, content_type='application/json')
+    assert [item['status'] for item in response.json()['responses']] == [200] * len(PATHS)
+
+
+if __name__ == '__main__':
+    bench('4 separate GETs', separate, number=200)
+    bench('1 batch of 4', batched, number=200)
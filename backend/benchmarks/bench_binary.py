@@ -0,0 +1,39 @@
+"""
+Payload size and encode/decode speed of the JSON, MessagePack and CBOR
+encodings of the 1000-course catalog, before and after gzip.
+"""
+from common import setup, bench
+
+setup()
+
+import decimal
+import io
+import zlib
+
+from api.models import University, Course
+from api.renderers import (
+    CBORParser, CBORRenderer, FastJSONParser, FastJSONRenderer, MessagePackParser, MessagePackRenderer
+)
+from api.serializers import CourseSerializer
+
+university = University.objects.create(name='Bench University', description='D', location='Kathmandu', website='https://bench.example.com')
+Course.objects.bulk_create([
+    Course(university=university, name=f'Course {i}', description='An in-depth programme covering theory and practice.',
+           duration='4 years', fees=decimal.Decimal('125000.50') + i, level='Undergraduate')
+    for i in range(1000)
+])
+courses = CourseSerializer(Course.objects.select_related('university'), many=True).data
+formats = {
+    'JSON': (FastJSONRenderer, FastJSONParser),
+    'MessagePack': (MessagePackRenderer, MessagePackParser),
+    'CBOR': (CBORRenderer, CBORParser),
+}
+
+
+if __name__ == '__main__':
+    for label, (renderer, parser) in formats.items():
+        body = renderer().render(courses)
+        gzipped = zlib.compress(body, 6)
+        print(f'{label}: {len(body)} bytes, {len(gzipped)} bytes deflated')
+        bench('  encode', lambda: renderer().render(courses), number=20)
+        bench('  decode', lambda: parser().parse(io.BytesIO(body)), number=20)
@@ -0,0 +1,51 @@
+"""
+An hourly poll after a handful of edits: /api/catalog/changes/?since= against
+downloading /api/universities/ and /api/courses/ again, with 200 universities
+of 50 courses each. Response caching is bypassed so every call does the work.
+"""
+from common import setup, bench
+
+setup()
+
+from django.test import Client
+from api.catalog_changes import current_version
+from api.models import University, Course
+from api.tiered_cache import tiered
+
+universities = University.objects.bulk_create([
+    University(name=f'University {i}', description='D', location='Kathmandu', ranking=i, website='https://bench.example.com')
+    for i in range(200)
+])
+Course.objects.bulk_create([
+    Course(university=university, name=f'Course {j}', description='An in-depth programme.', duration='4 years',
+           fees=125000 + j, level='Undergraduate')
+    for university in universities for j in range(50)
+])
+
+since = current_version()
+for course in Course.objects.order_by('?')[:5]:
+    course.fees += 1000
+    course.save()
+Course.objects.filter(pk=Course.objects.order_by('-pk').values_list('pk', flat=True)[:1]).delete()
+
+client = Client(SERVER_NAME='localhost')
+
+
+def get(url):
+    tiered.local.clear()
+    tiered.shared.clear()
+    return client.get(url)
+
+
+def full():
+    return len(get('/api/universities/').content) + len(get('/api/courses/').content)
+
+
+def delta():
+    return len(get(f'/api/catalog/changes/?since={since}').content)
+
+
+if __name__ == '__main__':
+    print(f'full download: {full()} bytes, delta: {delta()} bytes')
+    bench('full download', full, number=5)
+    bench('delta', delta, number=200)
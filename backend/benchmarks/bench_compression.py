@@ -0,0 +1,48 @@
+"""
+Bytes on the wire and per-request cost of response compression.
+
+Fetches /api/universities/ (universities with nested courses) through the
+full middleware stack with each Accept-Encoding, and times compressing the
+same body without the compressed-body cache.
+"""
+from common import setup, bench
+
+setup()
+
+from django.test import Client
+from api.middleware import available_codecs
+from api.models import University, Course
+
+universities = University.objects.bulk_create([
+    University(name=f'University {i}', description=f'University {i} offers a broad range of programmes.',
+               location='Kathmandu', ranking=i, website=f'https://university{i}.example.com')
+    for i in range(100)
+])
+Course.objects.bulk_create([
+    Course(university=university, name=f'Course {j} at {university.name}',
+           description='An in-depth programme covering theory and practice.',
+           duration='4 years', fees=125000 + j, level='Undergraduate' if j % 2 else 'Postgraduate')
+    for university in universities for j in range(10)
+])
+from api import catalog
+catalog.invalidate('catalog')
+
+client = Client(SERVER_NAME='localhost')
+URL = '/api/universities/'
+
+
+def fetch(encoding):
+    def run():
+        return client.get(URL, HTTP_ACCEPT_ENCODING=encoding)
+    return run
+
+
+if __name__ == '__main__':
+    body = fetch('identity')().content
+    print(f"{'uncompressed':<48} {len(body):10d} bytes")
+    bench('request, no compression', fetch('identity'), number=20)
+    for codec in available_codecs():
+        response = fetch(codec.name)()
+        print(f"{codec.name:<48} {len(response.content):10d} bytes")
+        bench(f'request, {codec.name} (compressed body cached)', fetch(codec.name), number=20)
+        bench(f'compress body with {codec.name} (cache miss cost)', lambda: codec.compress(body), number=20)
@@ -0,0 +1,48 @@
+"""
+JSON rendering and parsing speed: DRF's stock classes against the orjson
+backed ones in api/renderers.py.
+
+Renders a realistic catalog payload (serialized courses with Decimal fees,
+plus raw datetimes and Decimals as found in hand-built responses) and parses
+the result back.
+"""
+from common import setup, bench
+
+setup()
+
+import decimal
+import io
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from api.renderers import FastJSONParser, FastJSONRenderer, orjson
+from api.models import University, Course
+from api.serializers import CourseSerializer
+
+university = University.objects.create(name='Bench University', description='D', location='Kathmandu', website='https://bench.example.com')
+Course.objects.bulk_create([
+    Course(university=university, name=f'Course {i}', description='An in-depth programme covering theory and practice.',
+           duration='4 years', fees=decimal.Decimal('125000.50') + i, level='Undergraduate')
+    for i in range(1000)
+])
+courses = CourseSerializer(Course.objects.select_related('university'), many=True).data
+now = timezone.now()
+raw = [
+    {'id': i, 'fees': decimal.Decimal('125000.50') + i, 'created_at': now - timedelta(minutes=i), 'title': f'Item {i}'}
+    for i in range(1000)
+]
+payloads = {'1000 serialized courses': courses, '1000 raw rows (Decimal, datetime)': raw}
+
+
+if __name__ == '__main__':
+    print('orjson available:', orjson is not None)
+    for label, data in payloads.items():
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+        body = JSONRenderer().render(data)
+        print(f'{label}: {len(body)} bytes')
+        bench('  render, DRF JSONRenderer', lambda: JSONRenderer().render(data), number=20)
+        bench('  render, FastJSONRenderer', lambda: FastJSONRenderer().render(data), number=20)
+        bench('  parse, DRF JSONParser', lambda: JSONParser().parse(io.BytesIO(body)), number=20)
+        bench('  parse, FastJSONParser', lambda: FastJSONParser().parse(io.BytesIO(body)), number=20)
@@ -0,0 +1,38 @@
+"""
+Login cost through the login_user view (POST /api/login/ style payload).
+
+Each call runs the configured password hasher, so the numbers are dominated
+by how many times a login hashes the password.
+"""
+import contextlib
+import io
+
+from common import setup, bench
+
+setup()
+
+from rest_framework.test import APIRequestFactory
+from api.models import CustomUser
+from api.views import login_user
+
+factory = APIRequestFactory()
+PASSWORD = 'Bench-password-1'
+user = CustomUser.objects.create_user(username='bench', email='bench@example.com', password=PASSWORD)
+
+
+def login(login_id, password=PASSWORD):
+    def run():
+        request = factory.post('/api/login/', {'username': login_id, 'password': password}, format='json')
+        with contextlib.redirect_stdout(io.StringIO()):
+            login_user(request)
+    return run
+
+
+if __name__ == '__main__':
+    results = {
+        'username': bench('login by username', login('bench'), number=5, repeat=3),
+        'email': bench('login by email', login('bench@example.com'), number=5, repeat=3),
+        'unknown': bench('login with unknown user', login('nobody@example.com'), number=5, repeat=3),
+        'wrong': bench('login with wrong password', login('bench', 'wrong'), number=5, repeat=3),
+    }
+    print(f"email logins per second per core: {1e6 / results['email']:.1f}")
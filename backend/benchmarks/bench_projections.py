@@ -0,0 +1,49 @@
+"""
+List serialization: the ModelSerializers against the `.values_list()`
+projections in api/projections.py, on 10k-row lists. Both include the
+queries.
+"""
+from common import setup, bench
+
+setup()
+
+import decimal
+
+from django.utils import timezone
+from api.models import CustomUser, Course, Feedback, Notification, University
+from api.projections import CourseProjection, FeedbackProjection, NotificationProjection, UniversityProjection
+from api.serializers import CourseSerializer, FeedbackSerializer, NotificationSerializer, UniversitySerializer
+
+ROWS = 10000
+
+user = CustomUser.objects.create_user(username='bench', email='bench@example.com')
+sender = CustomUser.objects.create_user(username='sender')
+universities = University.objects.bulk_create([
+    University(name=f'University {i}', description='D', location='Kathmandu', website='https://bench.example.com', ranking=i)
+    for i in range(ROWS)
+])
+Course.objects.bulk_create([
+    Course(university=universities[i % 100], name=f'Course {i}', description='An in-depth programme covering theory and practice.',
+           duration='4 years', fees=decimal.Decimal('125000.50') + i, level='Undergraduate')
+    for i in range(ROWS)
+])
+Feedback.objects.bulk_create([Feedback(user=user, subject=f'Subject {i}', message='M') for i in range(ROWS)])
+now = timezone.now()
+Notification.objects.bulk_create([
+    Notification(recipient=user, sender=sender if i % 2 else None, message=f'Message {i}', updated_at=now)
+    for i in range(ROWS)
+])
+
+cases = [
+    ('courses', CourseSerializer, CourseProjection, Course.objects.select_related('university')),
+    ('universities (with courses)', UniversitySerializer, UniversityProjection, University.objects.prefetch_related('courses')),
+    ('feedback', FeedbackSerializer, FeedbackProjection, Feedback.objects.select_related('user').prefetch_related('responses')),
+    ('notifications', NotificationSerializer, NotificationProjection, Notification.objects.select_related('recipient', 'sender')),
+]
+
+
+if __name__ == '__main__':
+    for label, serializer, projection, queryset in cases:
+        print(f'{ROWS} {label}:')
+        bench('  serializer', lambda: serializer(queryset.all(), many=True).data, number=3)
+        bench('  projection', lambda: projection().data(queryset.all()), number=3)
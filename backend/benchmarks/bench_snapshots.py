@@ -0,0 +1,54 @@
+"""
+First load of the catalog (200 universities of 50 courses each) by a client
+accepting gzip: /api/universities/ and /api/courses/ built from the database
+(response cache bypassed), against the snapshot manifest plus the
+precompressed snapshot file.
+"""
+import shutil
+import tempfile
+
+from common import setup, bench
+
+setup()
+
+from django.conf import settings
+from django.test import Client
+from api.models import University, Course
+from api.snapshots import build
+from api.tiered_cache import tiered
+
+settings.MEDIA_ROOT = tempfile.mkdtemp()
+settings.CATALOG_SNAPSHOT_AUTO_BUILD = False
+
+universities = University.objects.bulk_create([
+    University(name=f'University {i}', description='D', location='Kathmandu', ranking=i, website='https://bench.example.com')
+    for i in range(200)
+])
+Course.objects.bulk_create([
+    Course(university=university, name=f'Course {j}', description='An in-depth programme.', duration='4 years',
+           fees=125000 + j, level='Undergraduate')
+    for university in universities for j in range(50)
+])
+
+client = Client(SERVER_NAME='localhost', HTTP_ACCEPT_ENCODING='gzip')
+
+
+def from_database():
+    tiered.local.clear()
+    tiered.shared.clear()
+    return len(client.get('/api/universities/').content) + len(client.get('/api/courses/').content)
+
+
+def from_snapshot():
+    url = client.get('/api/catalog/snapshot/').json()['files']['json']
+    return len(b''.join(client.get(url.replace('http://localhost', '')).streaming_content))
+
+
+if __name__ == '__main__':
+    try:
+        bench('build_catalog_snapshot', build, number=1, repeat=3)
+        print(f'database: {from_database()} bytes, snapshot: {from_snapshot()} bytes (gzip)')
+        bench('first load from the database', from_database, number=5)
+        bench('first load from the snapshot', from_snapshot, number=200)
+    finally:
+        shutil.rmtree(settings.MEDIA_ROOT)
@@ -0,0 +1,38 @@
+"""
+/api/universities/?fields=... through the full stack: computed on every
+request, served from the shared (L2, database) tier, and from the in-process
+L1 tier.
+"""
+from common import setup, bench
+
+setup()
+
+from django.test import Client
+from django.test.utils import override_settings
+from api.models import University, Course
+from api.tiered_cache import tiered
+
+universities = University.objects.bulk_create([
+    University(name=f'University {i}', description='D', location='Kathmandu', ranking=i, website='https://bench.example.com')
+    for i in range(200)
+])
+Course.objects.bulk_create([
+    Course(university=university, name=f'Course {j}', description='An in-depth programme.', duration='4 years',
+           fees=125000 + j, level='Undergraduate')
+    for university in universities for j in range(10)
+])
+
+client = Client(SERVER_NAME='localhost')
+URL = '/api/universities/?fields=id,name,courses.name'
+
+
+def miss():
+    tiered.invalidate('catalog')
+    client.get(URL)
+
+
+if __name__ == '__main__':
+    bench('computed (tag invalidated each time)', miss, number=50)
+    with override_settings(TIERED_CACHE_L1_TTL=0):
+        bench('L2 hit', lambda: client.get(URL), number=200)
+    bench('L1 hit', lambda: client.get(URL), number=200)
@@ -0,0 +1,43 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Each script is run directly from the backend directory, e.g.
+    python benchmarks/bench_auth.py
+and works against a throwaway in-memory SQLite database, so it never touches
+db.sqlite3.
+"""
+import os
+import sys
+import time
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+import django
+from django.conf import settings
+
+
+def setup():
+    """Configure Django against an in-memory database and create the schema"""
+    import logging
+    settings.DATABASES['default']['NAME'] = ':memory:'
+    django.setup()
+    logging.disable(logging.CRITICAL)
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0, run_syncdb=True)
+
+
+def bench(label, func, number=2000, repeat=5):
+    """Run func `number` times, `repeat` rounds; print and return the best per-call time in microseconds"""
+    func()  # warm up
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    micros = best * 1e6
+    print(f"{label:<48} {micros:10.1f} us/call")
+    return micros
@@ -1,5 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axiosInstance from '../utils/axiosConfig';
+import { batchGet } from '../utils/batch';
 import { FiGrid, FiBookOpen, FiUsers, FiMessageSquare } from 'react-icons/fi';
 import Footer from '../components/Footer';
 import AdminPromoter from '../components/AdminPromoter';
@@ -20,7 +21,17 @@ const AdminDashboard = () => {
   const [editMode, setEditMode] = useState(false);
   const [editItemId, setEditItemId] = useState(null);
 
-  // Check admin status from backend profile
+  // Only the table columns of each tab; course ids are enough for the course count
+  const tableRequests = {
+    universities: { path: '/universities/', query: { fields: 'id,name,location,ranking,courses.id' } },
+    courses: { path: '/courses/', query: { fields: 'id,name,university_name,level,duration,fees' } },
+    users: { path: '/users/' },
+  };
+
+  // Table data fetched together with the admin check, used by the first tab load
+  const prefetchedTab = useRef(null);
+
+  // Check admin status from backend profile, fetching the current tab's table in the same round trip
   useEffect(() => {
     const checkAdmin = async () => {
       if (!isLoaded || !user) {
@@ -28,10 +39,14 @@ const AdminDashboard = () => {
         return;
       }
       try {
-        const response = await axiosInstance.get('/me/');
-        setIsAdmin(response.data.role === 'admin');
-        console.log('[AdminDashboard] Backend user info:', response.data);
-        console.log('[AdminDashboard] Backend role:', response.data.role);
+        const [me, table] = await batchGet([{ path: '/me/' }, tableRequests[activeTab]]);
+        if (me.status !== 200) {
+          throw new Error(`Fetching /me/ failed with status ${me.status}`);
+        }
+        prefetchedTab.current = { tab: activeTab, ...table };
+        setIsAdmin(me.body.role === 'admin');
+        console.log('[AdminDashboard] Backend user info:', me.body);
+        console.log('[AdminDashboard] Backend role:', me.body.role);
       } catch (error) {
         setIsAdmin(false);
         console.error('[AdminDashboard] Error fetching user info:', error);
@@ -69,6 +84,23 @@ const AdminDashboard = () => {
   };
 
   useEffect(() => {
+    // Use the table fetched with the admin check, or fetch it now
+    const getTable = async () => {
+      const prefetched = prefetchedTab.current;
+      prefetchedTab.current = null;
+      if (prefetched && prefetched.tab === activeTab) {
+        if (prefetched.status >= 400) {
+          const error = new Error(prefetched.body?.error || `Request failed with status ${prefetched.status}`);
+          error.response = { status: prefetched.status, data: prefetched.body };
+          throw error;
+        }
+        return prefetched.body;
+      }
+      const { path, query } = tableRequests[activeTab];
+      const response = await axiosInstance.get(path, { params: query });
+      return response.data;
+    };
+
     const fetchData = async () => {
       // Only fetch data if user is loaded and is an admin
       if (!isLoaded || !isAdmin) {
@@ -82,20 +114,18 @@ const AdminDashboard = () => {
         setIsForbiddenError(false);
         
         if (activeTab === 'universities') {
-          const response = await axiosInstance.get(`/universities/`);
-          setUniversities(response.data);
+          setUniversities(await getTable());
         } 
         else if (activeTab === 'courses') {
-          const response = await axiosInstance.get(`/courses/`);
-          setCourses(response.data);
+          setCourses(await getTable());
         }
         // Fetch real users from our new endpoint
         else if (activeTab === 'users') {
           try {
             console.log('Fetching users...');
-            const response = await axiosInstance.get(`/users/`);
-            console.log('Users API response:', response.data);
-            setUsers(response.data || []);
+            const data = await getTable();
+            console.log('Users API response:', data);
+            setUsers(data || []);
             setError(''); // Clear error on successful fetch
             setIsForbiddenError(false); // Clear forbidden flag
           } catch (error) {
@@ -4,6 +4,7 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { FiX, FiPlus, FiBookOpen, FiClock, FiDollarSign, FiAward, FiMapPin, FiCheckCircle, FiAlertCircle } from 'react-icons/fi';
 import { useAuth } from '../context/AuthContext';
 import axiosInstance from '../utils/axiosConfig';
+import { loadCatalog } from '../utils/catalog';
 
 const COMPARE_LIMIT = 5;
 
@@ -32,8 +33,9 @@ const CourseComparison = () => {
   useEffect(() => {
     const fetchCourses = async () => {
       try {
-        const response = await axiosInstance.get('/courses/');
-        setCourses(response.data);
+        // The picker only needs names, which the catalog snapshot has
+        const catalog = await loadCatalog();
+        setCourses(catalog.courses);
       } catch (err) {
         console.error('Error fetching courses:', err);
         setError('Could not load courses.');
@@ -52,29 +54,16 @@ const CourseComparison = () => {
       }
       try {
         setLoading(true);
-        const courseData = [];
-        const validCourseIds = [];
+        // One request for every compared course, with fee and duration comparisons
+        const response = await axiosInstance.get('/courses/batch/', {
+          params: { ids: selectedCourses.join(',') }
+        });
+        const { courses: courseData, missing } = response.data;
         
-        // Fetch each course and filter out invalid IDs
-        for (const courseId of selectedCourses) {
-          try {
-            const response = await axiosInstance.get(`/courses/${courseId}/`);
-            courseData.push(response.data);
-            validCourseIds.push(courseId);
-          } catch (err) {
-            if (err.response?.status === 404) {
-              console.warn(`Course ${courseId} not found, removing from comparison`);
-              // Skip this course - it doesn't exist
-            } else {
-              // Re-throw if it's not a 404 error
-              throw err;
-            }
-          }
-        }
-        
-        // Update selectedCourses if any were invalid
-        if (validCourseIds.length !== selectedCourses.length) {
-          setSelectedCourses(validCourseIds);
+        // Drop courses that no longer exist
+        if (missing.length > 0) {
+          console.warn(`Courses ${missing.join(', ')} not found, removing from comparison`);
+          setSelectedCourses(selectedCourses.filter(id => !missing.includes(id)));
         }
         
         setCompareData(courseData);
@@ -255,6 +244,11 @@ const CourseComparison = () => {
                   <ComparisonFeature label="Level" icon={FiAward} values={compareData.map(c => c.level)} highlight />
                   <ComparisonFeature label="Duration" icon={FiClock} values={compareData.map(c => c.duration)} />
                   <ComparisonFeature label="Fees" icon={FiDollarSign} values={compareData.map(c => c.fees)} highlight />
+                  <ComparisonFeature
+                    label="Fees vs. cheapest"
+                    icon={FiDollarSign}
+                    values={compareData.map(c => (Number(c.fee_delta) === 0 ? 'Cheapest' : `+${c.fee_delta}`))}
+                  />
                 </div>
               </motion.div>
             ) : !loading && compareData.length === 0 ? (
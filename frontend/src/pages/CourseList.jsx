@@ -6,6 +6,7 @@ import CourseCard from '../components/CourseCard';
 import CompareButton from '../components/CompareButton';
 import CompareFloatingButton from '../components/CompareFloatingButton';
 import axiosInstance from '../utils/axiosConfig';
+import { loadCatalog } from '../utils/catalog';
 
 const CourseList = () => {
   const [courses, setCourses] = useState([]);
@@ -23,9 +24,9 @@ const CourseList = () => {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        // Fetch all universities for the filter
-  const uniResponse = await axiosInstance.get(`/universities/`);
-        setUniversities(uniResponse.data);
+        // Universities for the filter, and on an unfiltered visit the courses too, come from the catalog snapshot
+        const catalog = await loadCatalog();
+        setUniversities(catalog.universities);
         
         // Parse query parameters from the URL
         const params = new URLSearchParams(location.search);
@@ -39,6 +40,11 @@ const CourseList = () => {
           level: initialLevel
         });
         
+        if (!initialQuery && !initialUniversity && !initialLevel) {
+          setCourses(catalog.courses);
+          return;
+        }
+
         // Fetch courses with the filters
         let url = `/courses/?query=${initialQuery}`;
         if (initialUniversity) url += `&university=${initialUniversity}`;
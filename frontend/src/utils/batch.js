@@ -0,0 +1,12 @@
+import axiosInstance from './axiosConfig';
+
+// Send several GETs in one round trip through /api/batch/.
+// Each request is { path, query } with a path relative to /api, like the
+// paths passed to axiosInstance. Resolves to one { status, body } per
+// request, in order; a failing sub-request does not reject the batch.
+export async function batchGet(requests) {
+  const response = await axiosInstance.post('/batch/', {
+    requests: requests.map(({ path, query }) => ({ method: 'GET', path: `/api${path}`, query })),
+  });
+  return response.data.responses;
+}
@@ -0,0 +1,50 @@
+import axiosInstance from './axiosConfig';
+
+// The whole catalog ({ universities, courses }) for the course pages.
+// It is loaded from the prebuilt snapshot, a static file the browser can
+// keep forever, then brought up to date with /catalog/changes/. Without a
+// snapshot it falls back to the list endpoints. The result is shared by
+// every page of the session.
+let catalogPromise = null;
+
+function applyChanges(rows, changed, deleted) {
+  const byId = new Map(rows.map((row) => [row.id, row]));
+  changed.forEach((row) => byId.set(row.id, row));
+  deleted.forEach((id) => byId.delete(id));
+  return [...byId.values()];
+}
+
+async function fetchCatalog() {
+  try {
+    const { data: manifest } = await axiosInstance.get('/catalog/snapshot/');
+    const snapshot = await fetch(manifest.files.json).then((response) => {
+      if (!response.ok) throw new Error(`Snapshot request failed with ${response.status}`);
+      return response.json();
+    });
+    let { version, universities, courses } = snapshot;
+    for (let more = true; more;) {
+      const { data: delta } = await axiosInstance.get('/catalog/changes/', { params: { since: version } });
+      universities = applyChanges(universities, delta.universities, delta.deleted.universities);
+      courses = applyChanges(courses, delta.courses, delta.deleted.courses);
+      ({ version, more } = delta);
+    }
+    return { universities, courses };
+  } catch (err) {
+    console.warn('Catalog snapshot unavailable, loading the lists instead', err);
+    const [universities, courses] = await Promise.all([
+      axiosInstance.get('/universities/', { params: { expand: '' } }),
+      axiosInstance.get('/courses/'),
+    ]);
+    return { universities: universities.data, courses: courses.data };
+  }
+}
+
+export function loadCatalog() {
+  if (!catalogPromise) {
+    catalogPromise = fetchCatalog().catch((err) => {
+      catalogPromise = null;
+      throw err;
+    });
+  }
+  return catalogPromise;
+}
@@ -13,6 +13,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
+from api import catalog_changes, snapshots
 from api.models import University, Course
 
 def clean_fees(fees_str):
@@ -37,50 +38,52 @@ def load_courses_from_json(json_file_path, clear_existing=False):
         created_count = 0
         updated_count = 0
         
-        for course_data in courses_data:
-            # Extract data from JSON
-            university_name = course_data.get('university', '')
-            course_name = course_data.get('Course Name', course_data.get('name', ''))
-            description = course_data.get('description', '')
-            duration = course_data.get('Duration', course_data.get('duration', ''))
-            fees_str = course_data.get('Fees', course_data.get('fees', '0'))
-            level = course_data.get('Level', course_data.get('level', 'Undergraduate'))
-            
-            # Clean fees data
-            fees = clean_fees(fees_str)
-            
-            # Get or create university
-            university, uni_created = University.objects.get_or_create(
-                name=university_name,
-                defaults={
-                    'description': f'{university_name} - A prestigious institution',
-                    'location': 'United States',
-                    'ranking': 1,
-                    'website': f'https://www.{university_name.lower().replace(" ", "")}.edu',
-                }
-            )
-            
-            if uni_created:
-                print(f'  🏛️  Created university: {university_name}')
-            
-            # Create or update course
-            course, created = Course.objects.update_or_create(
-                name=course_name,
-                university=university,
-                defaults={
-                    'description': description,
-                    'duration': duration,
-                    'fees': fees,
-                    'level': level,
-                }
-            )
-            
-            if created:
-                created_count += 1
-                print(f'  ✅ Created: {course_name}')
-            else:
-                updated_count += 1
-                print(f'  🔄 Updated: {course_name}')
+        # The whole file is recorded as one catalog version
+        with catalog_changes.batch():
+            for course_data in courses_data:
+                # Extract data from JSON
+                university_name = course_data.get('university', '')
+                course_name = course_data.get('Course Name', course_data.get('name', ''))
+                description = course_data.get('description', '')
+                duration = course_data.get('Duration', course_data.get('duration', ''))
+                fees_str = course_data.get('Fees', course_data.get('fees', '0'))
+                level = course_data.get('Level', course_data.get('level', 'Undergraduate'))
+                
+                # Clean fees data
+                fees = clean_fees(fees_str)
+                
+                # Get or create university
+                university, uni_created = University.objects.get_or_create(
+                    name=university_name,
+                    defaults={
+                        'description': f'{university_name} - A prestigious institution',
+                        'location': 'United States',
+                        'ranking': 1,
+                        'website': f'https://www.{university_name.lower().replace(" ", "")}.edu',
+                    }
+                )
+                
+                if uni_created:
+                    print(f'  🏛️  Created university: {university_name}')
+                
+                # Create or update course
+                course, created = Course.objects.update_or_create(
+                    name=course_name,
+                    university=university,
+                    defaults={
+                        'description': description,
+                        'duration': duration,
+                        'fees': fees,
+                        'level': level,
+                    }
+                )
+                
+                if created:
+                    created_count += 1
+                    print(f'  ✅ Created: {course_name}')
+                else:
+                    updated_count += 1
+                    print(f'  🔄 Updated: {course_name}')
         
         return created_count, updated_count
         
@@ -135,6 +138,11 @@ def main():
     print(f'   🏛️  Total Universities: {University.objects.count()}')
     print(f'   📖 Total Courses: {Course.objects.count()}')
     print('=' * 50)
+
+    # Built here: the background builder's thread would die with this script
+    print('\n📦 Building catalog snapshot...')
+    manifest = snapshots.build()
+    print(f"✅ Snapshot built at catalog version {manifest['version']}")
     print('\n✅ Course data loading complete!')
 
 if __name__ == '__main__':